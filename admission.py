@@ -0,0 +1,110 @@
+import math
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List
+from fastapi import HTTPException
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used for coalescing and caching keys."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight calls: the first caller for a key starts the work and
+    every concurrent caller with the same key awaits the same result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Coalesced request onto an in-flight call")
+        # Shield so one disconnecting caller doesn't cancel the work shared with others
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class TokenBucket:
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+
+class AdmissionController:
+    def __init__(self, rate: float = 0.5, burst: int = 5, max_queue: int = 3, max_wait: float = 10.0,
+                 max_users: int = 10000):
+        """
+        Per-user token-bucket admission control with a bounded wait queue.
+        - rate / burst: sustained requests per second and bucket size per user
+        - max_queue: how many requests a user may have waiting for tokens
+        - max_wait: longest a request may wait before being rejected with 429
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_users = max_users
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def _refill(self, bucket: TokenBucket, now: float):
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+
+    def _prune(self, now: float):
+        # Full buckets carry no state worth keeping
+        idle: List[str] = []
+        for user_id, bucket in self.buckets.items():
+            self._refill(bucket, now)
+            if bucket.tokens >= self.burst:
+                idle.append(user_id)
+        for user_id in idle:
+            del self.buckets[user_id]
+
+    async def acquire(self, user_id: str):
+        """
+        Reserve one token for the user, waiting in line if the bucket is empty.
+        Raises HTTPException(429) with Retry-After when the user's queue is saturated.
+        """
+        now = time.monotonic()
+        if user_id not in self.buckets and len(self.buckets) >= self.max_users:
+            self._prune(now)
+        bucket = self.buckets.setdefault(user_id, TokenBucket(self.burst))
+        self._refill(bucket, now)
+
+        # Tokens may go negative: each negative unit is one queued request
+        bucket.tokens -= 1
+        if bucket.tokens >= 0:
+            return
+
+        wait = -bucket.tokens / self.rate
+        if -bucket.tokens > self.max_queue or wait > self.max_wait:
+            bucket.tokens += 1
+            # Tokens needed before a new request fits in the queue and the wait limit
+            admissible = 1 - min(self.max_queue, self.max_wait * self.rate)
+            retry_after = max(1, math.ceil((admissible - bucket.tokens) / self.rate))
+            logger.warning(f"Rate limit exceeded for {user_id}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            bucket.tokens += 1
+            raise
@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 from dotenv import load_dotenv
 import os
@@ -13,6 +15,11 @@ load_dotenv()
 # FastAPI backend URL
 API_BASE_URL = "http://localhost:8000"
 
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (3.05, 10)
+# /query answers within the server's deadline (REQUEST_DEADLINE_SECONDS) plus admission queueing
+QUERY_TIMEOUT = (3.05, 45)
+
 # Page configuration
 st.set_page_config(
     page_title="RoleFlow Chat",
@@ -219,16 +226,62 @@ if 'chat_history' not in st.session_state:
 if 'available_departments' not in st.session_state:
     st.session_state.available_departments = []
 
+FALLBACK_DEPARTMENTS = ["Business", "Compliance", "Data", "Design", "Finance", "HR", "Marketing", "Operations", "Product", "Quality Assurance", "Risk", "Sales", "Technology"]
+
+# Pooled HTTP session, one per browser session (requests.Session isn't thread-safe and holds cookies)
+def get_http_session():
+    if 'http_session' not in st.session_state:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=10,
+            max_retries=Retry(total=2, backoff_factor=0.3, allowed_methods=["GET"])
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        st.session_state.http_session = session
+    return st.session_state.http_session
+
+http = get_http_session()
+
+# Cached only on success: a failed call raises, so an outage isn't remembered for the TTL
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_departments_from_api(_session):
+    response = _session.get(f"{API_BASE_URL}/available-departments", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
 # Function to fetch available departments
 def fetch_available_departments():
     try:
-        response = requests.get(f"{API_BASE_URL}/available-departments")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return ["Business", "Compliance", "Data", "Design", "Finance", "HR", "Marketing", "Operations", "Product", "Quality Assurance", "Risk", "Sales", "Technology"]
-    except:
-        return ["Business", "Compliance", "Data", "Design", "Finance", "HR", "Marketing", "Operations", "Product", "Quality Assurance", "Risk", "Sales", "Technology"]
+        return _fetch_departments_from_api(http)
+    except (requests.RequestException, ValueError):
+        return FALLBACK_DEPARTMENTS
+
+# Function to check backend health, cached briefly so reruns don't re-hit /health
+@st.cache_data(ttl=15, show_spinner=False)
+def _check_backend_health(_session):
+    try:
+        response = _session.get(f"{API_BASE_URL}/health", timeout=REQUEST_TIMEOUT)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
+def check_backend_health():
+    return _check_backend_health(http)
+
+# Function to clear the server-side conversation memory
+def clear_server_conversation():
+    if not st.session_state.jwt_token:
+        return
+    try:
+        http.delete(
+            f"{API_BASE_URL}/conversation",
+            headers={"Authorization": f"Bearer {st.session_state.jwt_token}"},
+            timeout=REQUEST_TIMEOUT
+        )
+    except requests.RequestException:
+        pass
 
 # Function to safely escape HTML content (for user input only)
 def safe_html_escape(text):
@@ -354,6 +407,7 @@ with st.sidebar:
         
         # Logout button
         if st.button("🚪 Logout", type="secondary", use_container_width=True):
+            clear_server_conversation()
             st.session_state.jwt_token = None
             st.session_state.user_data = None
             st.session_state.chat_history = []
@@ -362,6 +416,7 @@ with st.sidebar:
         # Chat history management
         st.markdown("### 💬 Chat Options")
         if st.button("🗑️ Clear Chat History", use_container_width=True):
+            clear_server_conversation()
             st.session_state.chat_history = []
             st.success("Chat history cleared!")
             
@@ -389,9 +444,10 @@ with st.sidebar:
                 if full_name and department:
                     try:
                         with st.spinner("Authenticating..."):
-                            response = requests.post(
+                            response = http.post(
                                 f"{API_BASE_URL}/login",
-                                json={"full_name": full_name, "department": department}
+                                json={"full_name": full_name, "department": department},
+                                timeout=REQUEST_TIMEOUT
                             )
                             response.raise_for_status()
                             data = response.json()
@@ -411,14 +467,9 @@ with st.sidebar:
         
         # Connection status
         st.markdown("### 🌐 Connection Status")
-        try:
-            # Simple health check
-            response = requests.get(f"{API_BASE_URL}/health", timeout=5)
-            if response.status_code == 200:
-                st.markdown('<span class="status-indicator status-online"></span>**Connected**', unsafe_allow_html=True)
-            else:
-                st.markdown('<span class="status-indicator status-offline"></span>**Disconnected**', unsafe_allow_html=True)
-        except:
+        if check_backend_health():
+            st.markdown('<span class="status-indicator status-online"></span>**Connected**', unsafe_allow_html=True)
+        else:
             st.markdown('<span class="status-indicator status-offline"></span>**Disconnected**', unsafe_allow_html=True)
 
 # Main chat interface
@@ -444,6 +495,7 @@ if st.session_state.jwt_token and st.session_state.user_data:
                 send_button = st.form_submit_button("📤 Send", type="primary", use_container_width=True)
             with col_clear:
                 if st.form_submit_button("🔄 New Chat", use_container_width=True):
+                    clear_server_conversation()
                     st.session_state.chat_history = []
                     st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
@@ -454,18 +506,20 @@ if st.session_state.jwt_token and st.session_state.user_data:
             
             try:
                 with st.spinner("🔍 Searching for answers..."):
-                    response = requests.post(
+                    response = http.post(
                         f"{API_BASE_URL}/query",
                         headers={"Authorization": f"Bearer {st.session_state.jwt_token}"},
-                        json={"query": user_query}
+                        json={"query": user_query},
+                        timeout=QUERY_TIMEOUT
                     )
                     response.raise_for_status()
                     result = response.json()
                     
-                    # Add conversation to history
+                    # Add conversation to history, rendering the answer's HTML only once
                     st.session_state.chat_history.append({
                         "user_query": user_query,
                         "bot_response": result,
+                        "response_html": convert_markdown_to_html(result.get('response', 'No response available')),
                         "timestamp": timestamp
                     })
                     
@@ -489,10 +543,11 @@ if st.session_state.jwt_token and st.session_state.user_data:
                 """, unsafe_allow_html=True)
                 
                 # Assistant response - new design
-                bot_response_text = conversation['bot_response'].get('response', 'No response available')
-                
-                # Convert markdown to HTML for proper formatting
-                formatted_response = convert_markdown_to_html(bot_response_text)
+                formatted_response = conversation.get('response_html')
+                if formatted_response is None:
+                    formatted_response = convert_markdown_to_html(
+                        conversation['bot_response'].get('response', 'No response available')
+                    )
                 
                 st.markdown(f"""
                     <div class="assistant-response-card">
@@ -540,7 +595,10 @@ if st.session_state.jwt_token and st.session_state.user_data:
         # Quick actions
         st.markdown("### ⚡ Quick Actions")
         if st.button("📋 Export Chat", use_container_width=True):
-            chat_export = json.dumps(st.session_state.chat_history, indent=2)
+            chat_export = json.dumps(
+                [{k: v for k, v in c.items() if k != 'response_html'} for c in st.session_state.chat_history],
+                indent=2
+            )
             st.download_button(
                 label="💾 Download Chat History",
                 data=chat_export,
@@ -4,6 +4,7 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import List, Optional
 from dotenv import load_dotenv
+from rbac import PolicyTable
 import os
 
 load_dotenv()
@@ -11,14 +12,30 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 if not SECRET_KEY:
     raise ValueError("JWT_SECRET_KEY not set in .env file")
 ALGORITHM = "HS256"
-C_LEVEL_IDS = ['FINEMP1000', 'FINEMP1001']  # Example C-Level IDs
+HR_DATA_PATH = os.getenv("HR_DATA_PATH", "data/hr/hr_data.csv")
+
+# Declarative access policy compiled over the HR table; hot-reloaded when either file changes
+policy_table = PolicyTable(os.getenv("RBAC_POLICY_PATH", "rbac_policy.json"), HR_DATA_PATH)
+
+# Users allowed to call the /admin endpoints; without ADMIN_USER_IDS, the policy's current c_level group
+ADMIN_USER_IDS = {i.strip() for i in os.getenv("ADMIN_USER_IDS", "").split(",") if i.strip()}
+
+def is_admin(employee_id) -> bool:
+    if ADMIN_USER_IDS:
+        return str(employee_id).strip() in ADMIN_USER_IDS
+    return policy_table.is_member("c_level", employee_id)
+
+def _hr_frame(hr_df_path: str) -> pd.DataFrame:
+    if os.path.abspath(hr_df_path) == os.path.abspath(policy_table.hr_path):
+        return policy_table.hr
+    return pd.read_csv(hr_df_path)
 
 def verify_user(hr_df_path: str, full_name: str, department: str) -> Optional[dict]:
     """
     Verify user against HR database and return user info if valid.
     """
     try:
-        hr_df = pd.read_csv(hr_df_path)
+        hr_df = _hr_frame(hr_df_path)
         n = full_name.strip().lower()
         d = department.strip().lower()
         match = hr_df[
@@ -28,7 +45,8 @@ def verify_user(hr_df_path: str, full_name: str, department: str) -> Optional[di
         if match.empty:
             return None
         user_data = match.iloc[0].to_dict()
-        accessible_folders = get_accessible_folders(user_data)
+        scope = policy_table.lookup(user_data["employee_id"])
+        scope_id, accessible_folders = scope if scope is not None else (None, get_accessible_folders(user_data))
         return {
             "employee_id": user_data["employee_id"],
             "full_name": user_data["full_name"],
@@ -36,35 +54,38 @@ def verify_user(hr_df_path: str, full_name: str, department: str) -> Optional[di
             "role": user_data["role"],
             "attendance_pct": user_data["attendance_pct"],
             "leave_balance": user_data["leave_balance"],
-            "accessible_folders": accessible_folders
+            "accessible_folders": accessible_folders,
+            "scope_id": scope_id
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Authentication error: {str(e)}")
 
 def get_accessible_folders(user_data: dict) -> List[str]:
     """
-    Determine accessible folders based on department and C-Level status.
+    Determine accessible folders from the access policy (precomputed for employees in the HR table).
+    """
+    scope = policy_table.lookup(user_data['employee_id'])
+    if scope is not None:
+        return scope[1]
+    return list(policy_table.policy.resolve(user_data['department'], user_data.get('role', ''), user_data['employee_id']))
+
+def refresh_user_scope(user_data: dict) -> Optional[dict]:
+    """
+    Current scope for a token's user, so policy changes apply without a new login.
+    Returns None if the employee is no longer in the HR table.
     """
-    department = user_data['department'].lower()
-    employee_id = user_data['employee_id']
-    if employee_id in C_LEVEL_IDS:
-        return ['engineering', 'finance', 'hr', 'marketing', 'general']
-    elif department == 'finance':
-        return ['finance', 'general']
-    elif department == 'marketing':
-        return ['marketing', 'general']
-    elif department == 'hr':
-        return ['hr', 'general']
-    elif department == 'technology':
-        return ['engineering', 'general']
-    else:
-        return ['general']
+    scope = policy_table.lookup(user_data['employee_id'])
+    if scope is None:
+        return None
+    scope_id, folders = scope
+    return {**user_data, "scope_id": scope_id, "accessible_folders": folders}
 
 def create_jwt_token(user_data: dict) -> str:
     """
     Create a JWT token with user info and accessible folders.
     """
     to_encode = user_data.copy()
+    to_encode.setdefault("sub", str(user_data["employee_id"]))
     expire = datetime.utcnow() + timedelta(hours=24)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
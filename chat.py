@@ -1,21 +1,63 @@
-from langchain.chains import RetrievalQA
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from langchain_community.chat_models import ChatOpenAI
-from langchain_community.vectorstores import Chroma
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from langchain.prompts import PromptTemplate
+from memory import format_turns
+from retrieval import retrieve_documents
+from profiles import AccessProfileIndex
+from timing import StageTimer
+from deadline import Deadline, DeadlineExceeded, LatencyTracker, call_with_deadline
 
+# Configure logging
+logger = logging.getLogger(__name__)
 
+# Per-request deadline and stage budgets (seconds)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+STORE_LOAD_BUDGET_SECONDS = float(os.getenv("STORE_LOAD_BUDGET_SECONDS", "5"))
+REWRITE_BUDGET_SECONDS = float(os.getenv("REWRITE_BUDGET_SECONDS", "3"))
+RETRIEVAL_BUDGET_SECONDS = float(os.getenv("RETRIEVAL_BUDGET_SECONDS", "8"))
+ATTRIBUTION_RESERVE_SECONDS = float(os.getenv("ATTRIBUTION_RESERVE_SECONDS", "0.25"))
 
-def setup_consolidated_rag_chain(vectorstores: Dict[str, Chroma], openrouter_api_key: str, accessible_folders: List[str]):
+# LLM calls run here so they can be bounded and hedged; answer latencies drive the hedge delay
+_llm_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_POOL_SIZE", "32")), thread_name_prefix="llm")
+llm_latency = LatencyTracker(
+    default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8")),
+    min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+)
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "true").lower() == "true"
+
+
+def get_llm(openrouter_api_key: str, temperature: float = 0.7, request_timeout: Optional[float] = None) -> ChatOpenAI:
     """
-    Set up RAG chain that can query multiple department vectorstores and provide consolidated responses.
+    Create the chat model client. OPENROUTER_API_BASE overrides the endpoint (e.g. a local stub).
+    With a request_timeout, the client gives up on its own and doesn't retry, so abandoned
+    hedged or timed-out calls don't hold a connection past the request's deadline.
     """
-    llm = ChatOpenAI(
-        temperature=0.7,
+    kwargs = {}
+    if request_timeout is not None:
+        kwargs = {"request_timeout": request_timeout, "max_retries": 0}
+    return ChatOpenAI(
+        temperature=temperature,
         openai_api_key=openrouter_api_key,
-        openai_api_base="https://openrouter.ai/api/v1",
-        model_name="mistralai/mistral-small-3.2-24b-instruct:free"
+        openai_api_base=os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
+        model_name=os.getenv("OPENROUTER_MODEL", "mistralai/mistral-small-3.2-24b-instruct:free"),
+        **kwargs
     )
+
+
+def _invoke_text(llm: ChatOpenAI, prompt: str) -> str:
+    response = llm.invoke(prompt)
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+def setup_consolidated_rag_chain(openrouter_api_key: str, request_timeout: Optional[float] = None):
+    """
+    Set up the prompt and LLM that turn context from multiple departments into one consolidated response.
+    """
+    llm = get_llm(openrouter_api_key, request_timeout=request_timeout)
     
     # Custom prompt template for consolidated responses across departments
     custom_prompt = PromptTemplate(
@@ -25,6 +67,9 @@ def setup_consolidated_rag_chain(vectorstores: Dict[str, Chroma], openrouter_api
                     Context from accessible departments:
                     {context}
 
+                    Conversation so far:
+                    {history}
+
                     Question: {question}
 
                     Instructions:
@@ -34,86 +79,168 @@ def setup_consolidated_rag_chain(vectorstores: Dict[str, Chroma], openrouter_api
                     - If some information is not available in the context, clearly state what is missing
                     - Be specific and include relevant details, metrics, or examples from the context
                     - Maintain a professional and helpful tone
+                    - Use the conversation so far only to resolve follow-up references
 
                     Answer:
                 """,
-        input_variables=["context", "question"]
+        input_variables=["context", "history", "question"]
     )
     
     return custom_prompt, llm
 
 
-def handle_consolidated_query_with_content_filtering(vectorstores: Dict[str, Chroma], query: str, accessible_folders: List[str], openrouter_api_key: str) -> Dict:
+def rewrite_standalone_query(history: str, question: str, openrouter_api_key: str, timeout: Optional[float] = None) -> str:
+    """
+    Rewrite a follow-up question into a standalone query suitable for retrieval.
+    """
+    prompt = (
+        "Given the conversation below and a follow-up question, rewrite the follow-up into a single "
+        "standalone question that can be understood without the conversation. "
+        "Return only the rewritten question.\n\n"
+        f"Conversation:\n{history}\n\nFollow-up question: {question}\n\nStandalone question:"
+    )
+    if timeout is None:
+        rewritten = _invoke_text(get_llm(openrouter_api_key, temperature=0), prompt).strip()
+    else:
+        rewritten = call_with_deadline(
+            lambda remaining: _invoke_text(get_llm(openrouter_api_key, temperature=0, request_timeout=remaining), prompt),
+            _llm_pool,
+            timeout
+        ).strip()
+    return rewritten or question
+
+
+def summarize_conversation(summary: str, turns: List[Tuple[str, str]], openrouter_api_key: str) -> str:
+    """
+    Fold older turns into the rolling conversation summary.
+    """
+    llm = get_llm(openrouter_api_key, temperature=0, request_timeout=REQUEST_DEADLINE_SECONDS)
+    prompt = (
+        "Update the running summary of a conversation between an employee and the company assistant. "
+        "Keep names, figures and topics that later questions may refer to, in at most 120 words.\n\n"
+        f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{format_turns(turns)}\n\nUpdated summary:"
+    )
+    response = llm.invoke(prompt)
+    return response.content if hasattr(response, 'content') else str(response)
+
+
+def build_partial_answer(chunks: List, registry, max_passages: int = 3, max_chars: int = 400) -> Dict:
+    """
+    Fallback when the deadline hits before the LLM answers: the top retrieved passages and their sources.
+    """
+    passages = []
+    source_ids = set()
+    for record in chunks[:max_passages]:
+        text = record.text.strip()
+        if len(text) > max_chars:
+            text = text[:max_chars].rsplit(" ", 1)[0] + "..."
+        passages.append(f"- {text}")
+        source_ids.update(record.source_ids)
+    response = (
+        "I couldn't generate a full answer in time. These are the most relevant passages "
+        "from your accessible documents:\n\n" + "\n\n".join(passages)
+    )
+    return {"response": response, "sources": registry.source_names(sorted(source_ids)), "partial": True}
+
+
+def build_timeout_answer() -> Dict:
+    """Fallback when the deadline hits before anything was retrieved."""
+    return {
+        "response": "I couldn't search your documents in time. Please try again.",
+        "sources": [],
+        "partial": True
+    }
+
+
+def handle_consolidated_query_with_content_filtering(profile_index: AccessProfileIndex, query: str, accessible_folders: List[str], openrouter_api_key: str, history: str = "", timer: Optional[StageTimer] = None, deadline: Optional[Deadline] = None) -> Dict:
     """
     Filter sources based on content similarity to the generated response.
+    Follow-up questions are rewritten into standalone queries for retrieval when history is given.
+    Every stage runs within the request's deadline: the rewrite is skipped if it runs over
+    its budget, departments that miss the retrieval budget are left out, a slow LLM call
+    is hedged with a second one, and if no answer arrives in time the top retrieved
+    passages are returned as a partial answer.
     """
-    all_docs = []
-    doc_to_source = {}
+    timer = timer or StageTimer()
+    deadline = deadline or Deadline(REQUEST_DEADLINE_SECONDS)
     
-    # Retrieve relevant documents from all accessible departments
-    for dept in accessible_folders:
-        if dept in vectorstores:
-            vectorstore = vectorstores[dept]
-            retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-            docs = retriever.get_relevant_documents(query)
-            
-            # Filter documents by department
-            for doc in docs:
-                if doc.metadata.get('department', '').lower() == dept.lower():
-                    all_docs.append(doc)
-                    source_file = doc.metadata.get('source_file', 'Unknown')
-                    doc_to_source[doc.page_content] = source_file
+    retrieval_query = query
+    if history:
+        with timer.stage("rewrite"):
+            rewrite_timeout = deadline.budget(REWRITE_BUDGET_SECONDS)
+            if rewrite_timeout > 0:
+                try:
+                    retrieval_query = rewrite_standalone_query(history, query, openrouter_api_key, timeout=rewrite_timeout)
+                except Exception as e:
+                    logger.warning(f"Query rewrite skipped: {e}")
     
-    if not all_docs:
-        return {"response": "No relevant information found in accessible documents.", "sources": []}
+    # Retrieve relevant documents from all accessible departments (adaptive depth, ranked by score)
+    retrieval_deadline = deadline.stage(RETRIEVAL_BUDGET_SECONDS, reserve=ATTRIBUTION_RESERVE_SECONDS)
+    scored_chunks = retrieve_documents(profile_index, retrieval_query, timer=timer, deadline=retrieval_deadline)
+    chunks = [record for record, _ in scored_chunks]
     
-    # Set up LLM and prompt
-    prompt_template, llm = setup_consolidated_rag_chain(vectorstores, openrouter_api_key, accessible_folders)
+    if not chunks:
+        if retrieval_deadline.expired():
+            return build_timeout_answer()
+        return {"response": "No relevant information found in accessible documents.", "sources": []}
     
-    # Prepare context from all relevant documents
-    context = "\n\n".join([doc.page_content for doc in all_docs])
+    llm_timeout = deadline.remaining() - ATTRIBUTION_RESERVE_SECONDS
+    if llm_timeout <= 0:
+        logger.warning("Deadline reached before generation; returning partial answer")
+        return build_partial_answer(chunks, profile_index.registry)
     
-    # Generate consolidated response
-    prompt = prompt_template.format(context=context, question=query)
-    response = llm.invoke(prompt)
-    response_text = response.content if hasattr(response, 'content') else str(response)
+    with timer.stage("prompt"):
+        # Set up LLM and prompt
+        prompt_template, _ = setup_consolidated_rag_chain(openrouter_api_key)
+        
+        # Prepare context from all relevant documents
+        context = "\n\n".join([record.text for record in chunks])
+        prompt = prompt_template.format(context=context, history=history or "(none)", question=query)
     
-    # Find which documents were actually used by checking content similarity
-    used_sources = set()
+    # Generate consolidated response (hedged after the observed p95 latency); each
+    # attempt's client times out when the LLM stage does, the hedge included
+    with timer.stage("llm"):
+        started = time.perf_counter()
+        try:
+            response_text = call_with_deadline(
+                lambda remaining: _invoke_text(get_llm(openrouter_api_key, request_timeout=remaining), prompt),
+                _llm_pool,
+                llm_timeout,
+                hedge_delay=llm_latency.hedge_delay() if LLM_HEDGING_ENABLED else None
+            )
+        except DeadlineExceeded:
+            logger.warning(f"LLM answer not received within {llm_timeout:.1f}s; returning partial answer")
+            return build_partial_answer(chunks, profile_index.registry)
+        llm_latency.record(time.perf_counter() - started)
     
-    # check if key phrases from documents appear in response
-    for doc in all_docs:
-        doc_content = doc.page_content.lower()
+    with timer.stage("attribution"):
+        # Find which documents were actually used by checking content similarity (interned source ids)
+        used_sources = set()
         response_lower = response_text.lower()
         
-        # Extract key phrases (words longer than 4 characters)
-        doc_words = [word for word in doc_content.split() if len(word) > 4]
-        
-        # Check if significant portion of document content is reflected in response
-        matches = sum(1 for word in doc_words if word in response_lower)
+        # check if key phrases from documents appear in response
+        for record in chunks:
+            doc_content = record.text.lower()
+            
+            # Extract key phrases (words longer than 4 characters)
+            doc_words = [word for word in doc_content.split() if len(word) > 4]
+            
+            # Check if significant portion of document content is reflected in response
+            matches = sum(1 for word in doc_words if word in response_lower)
+            
+            # If more than 20% of key words from document appear in response, consider it used
+            if len(doc_words) > 0 and matches / len(doc_words) > 0.2:
+                used_sources.update(record.source_ids)
         
-        # If more than 20% of key words from document appear in response, consider it used
-        if len(doc_words) > 0 and matches / len(doc_words) > 0.2:
-            source_file = doc.metadata.get('source_file', 'Unknown')
-            used_sources.add(source_file)
-    
-    # Fallback: if no sources identified through content matching, use top 2 most relevant
-    if not used_sources:
-        # Use similarity search to get top 2 most relevant documents
-        for dept in accessible_folders:
-            if dept in vectorstores:
-                vectorstore = vectorstores[dept]
-                docs_with_scores = vectorstore.similarity_search_with_score(query, k=1)
-                for doc, score in docs_with_scores:
-                    if doc.metadata.get('department', '').lower() == dept.lower() and score < 0.7:
-                        source_file = doc.metadata.get('source_file', 'Unknown')
-                        used_sources.add(source_file)
-                        if len(used_sources) >= 2:  # Limit to top 2 sources
-                            break
-            if len(used_sources) >= 2:
-                break
+        # Fallback: if no sources identified through content matching, use top 2 most relevant
+        if not used_sources:
+            # Retrieved documents are already thresholded and sorted by relevance
+            for record in chunks:
+                used_sources.update(record.source_ids[:2 - len(used_sources)])
+                if len(used_sources) >= 2:  # Limit to top 2 sources
+                    break
     
     return {
         "response": response_text,
-        "sources": list(used_sources)
+        "sources": profile_index.registry.source_names(sorted(used_sources))
     }
\ No newline at end of file
@@ -0,0 +1,89 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ChunkRecord:
+    """Compact retrieved chunk: integer ids for the chunk, its department and its source files."""
+    __slots__ = ("chunk_id", "department_id", "source_ids", "text")
+
+    def __init__(self, chunk_id: int, department_id: int, source_ids: Tuple[int, ...], text: str):
+        self.chunk_id = chunk_id
+        self.department_id = department_id
+        self.source_ids = source_ids
+        self.text = text
+
+
+class _InternTable:
+    def __init__(self):
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        table_id = self.ids.get(name)
+        if table_id is None:
+            table_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = table_id
+        return table_id
+
+
+class ChunkRegistry:
+    def __init__(self):
+        """
+        Process-wide registry of retrieved chunks. Department and source names are interned
+        once, each distinct chunk gets one integer id and one shared ChunkRecord, and
+        retrieval, caching and attribution pass records around instead of Documents.
+        """
+        self._departments = _InternTable()
+        self._sources = _InternTable()
+        self._records: Dict[tuple, ChunkRecord] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def department_id(self, department: str) -> int:
+        with self._lock:
+            return self._departments.intern(department)
+
+    def department_name(self, department_id: int) -> str:
+        return self._departments.names[department_id]
+
+    def source_names(self, source_ids: Iterable[int]) -> List[str]:
+        return [self._sources.names[source_id] for source_id in source_ids]
+
+    def register(self, doc, store_id: Optional[str] = None) -> ChunkRecord:
+        """
+        Record for a retrieved Document; repeated retrievals of the same chunk share it.
+        Near-duplicate merges ('source_files') are expanded into all contributing sources.
+        """
+        metadata = doc.metadata
+        with self._lock:
+            department_id = self._departments.intern(metadata.get('department', ''))
+            key = (department_id, store_id or getattr(doc, "id", None) or doc.page_content)
+            record = self._records.get(key)
+            if record is None:
+                merged = metadata.get('source_files')
+                if merged:
+                    sources = [s.strip() for s in merged.split(",") if s.strip()]
+                else:
+                    sources = [metadata.get('source_file', 'Unknown')]
+                record = ChunkRecord(
+                    self._next_id,
+                    department_id,
+                    tuple(self._sources.intern(source) for source in sources),
+                    doc.page_content
+                )
+                self._records[key] = record
+                self._next_id += 1
+            return record
+
+    def forget_department(self, department: str):
+        """Drop records of a reindexed department; results still cached keep their own references."""
+        with self._lock:
+            department_id = self._departments.ids.get(department)
+            if department_id is None:
+                return
+            for key in [key for key in self._records if key[0] == department_id]:
+                del self._records[key]
+
+    def __len__(self) -> int:
+        return len(self._records)
@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Any, Callable, Optional
+from timing import running_inline
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Absolute per-request deadline carried through retrieval and generation."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, stage_seconds: float, reserve: float = 0.0) -> float:
+        """Time a stage may use: its own budget, capped by what is left after `reserve`."""
+        return max(0.0, min(stage_seconds, self.remaining() - reserve))
+
+    def stage(self, stage_seconds: float, reserve: float = 0.0) -> "Deadline":
+        """Deadline for one stage: its budget, never past this deadline minus `reserve`."""
+        return Deadline(self.budget(stage_seconds, reserve))
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20, default_delay: float = 8.0, min_delay: float = 1.0):
+        """
+        Rolling window of call latencies used to pick the hedge delay (p95). Until enough
+        samples exist, default_delay is used.
+        """
+        self.samples: "deque[float]" = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return max(self.min_delay, p95 if p95 is not None else self.default_delay)
+
+
+def call_with_deadline(fn: Callable[[float], Any], executor: Executor, timeout: float,
+                       hedge_delay: Optional[float] = None) -> Any:
+    """
+    Run fn in the executor and return its result within `timeout` seconds. If hedge_delay
+    is given and the first attempt is still running (or has failed) by then, a second
+    attempt is started and the first successful result wins. Each attempt is called with
+    the seconds left when it starts and must not run longer, so an abandoned attempt
+    never outlives the deadline. Raises DeadlineExceeded when time runs out.
+    A profiled request (see timing.running_inline) makes a single attempt inline.
+    """
+    start = time.monotonic()
+    expires_at = start + timeout
+    if running_inline():
+        # Profiled request: one attempt on this thread, bounded by its own timeout
+        try:
+            return fn(timeout)
+        except Exception as e:
+            if time.monotonic() >= expires_at:
+                raise DeadlineExceeded(f"No result within {timeout:.1f}s") from e
+            raise
+    hedge_at = start + hedge_delay if hedge_delay is not None and hedge_delay < timeout else None
+
+    def attempt():
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"No time left of {timeout:.1f}s")
+        return fn(remaining)
+
+    pending = {executor.submit(attempt)}
+    error: Optional[BaseException] = None
+    while True:
+        now = time.monotonic()
+        if now >= expires_at:
+            raise DeadlineExceeded(f"No result within {timeout:.1f}s")
+
+        wait_for = expires_at - now
+        if hedge_at is not None:
+            wait_for = min(wait_for, max(0.0, hedge_at - now))
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+
+        if hedge_at is not None and (not pending or time.monotonic() >= hedge_at):
+            logger.info(f"Hedging call after {time.monotonic() - start:.2f}s")
+            pending.add(executor.submit(attempt))
+            hedge_at = None
+        elif not pending:
+            raise error
@@ -0,0 +1,103 @@
+import zlib
+import logging
+from collections import defaultdict
+from typing import Dict, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def _shingles(text: str, size: int) -> np.ndarray:
+    """Hashed word n-grams of a chunk (the whole text if it is shorter than one shingle)."""
+    words = text.lower().split()
+    if len(words) <= size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) & _MERSENNE_PRIME for g in set(grams)), dtype=np.uint64)
+
+
+class MinHashDeduplicator:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 42):
+        """
+        Near-duplicate detection with MinHash signatures and LSH banding.
+        Chunks whose estimated Jaccard similarity is at least `threshold` are clustered.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingles(text, self.shingle_size)
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def cluster(self, texts: List[str]) -> List[List[int]]:
+        """Group indices of near-duplicate texts; singletons are returned as one-element clusters."""
+        signatures = [self.signature(text) for text in texts]
+
+        parent = list(range(len(texts)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[int]] = defaultdict(list)
+            start = band * self.rows
+            for idx, sig in enumerate(signatures):
+                buckets[sig[start:start + self.rows].tobytes()].append(idx)
+            for members in buckets.values():
+                first = members[0]
+                for other in members[1:]:
+                    root_a, root_b = find(first), find(other)
+                    if root_a == root_b:
+                        continue
+                    # Verify LSH candidates against the full signature
+                    if np.mean(signatures[first] == signatures[other]) >= self.threshold:
+                        parent[root_b] = root_a
+
+        clusters: Dict[int, List[int]] = defaultdict(list)
+        for idx in range(len(texts)):
+            clusters[find(idx)].append(idx)
+        return list(clusters.values())
+
+
+def deduplicate_documents(docs: List[Document], threshold: float = 0.8) -> Tuple[List[Document], Dict]:
+    """
+    Keep one representative (the longest chunk) per near-duplicate cluster. The
+    representative records every contributing file in a comma-separated 'source_files'
+    metadata field. Returns the kept documents and dedup statistics.
+    """
+    if not docs:
+        return docs, {"input": 0, "output": 0, "dedup_ratio": 0.0}
+
+    deduplicator = MinHashDeduplicator(threshold=threshold)
+    clusters = deduplicator.cluster([doc.page_content for doc in docs])
+
+    kept = []
+    for members in sorted(clusters, key=min):
+        representative = docs[max(members, key=lambda i: len(docs[i].page_content))]
+        sources = sorted({docs[i].metadata.get('source_file', 'Unknown') for i in members})
+        representative.metadata['source_files'] = ", ".join(sources)
+        kept.append(representative)
+
+    stats = {
+        "input": len(docs),
+        "output": len(kept),
+        "dedup_ratio": 1.0 - len(kept) / len(docs),
+    }
+    return kept, stats
@@ -1,14 +1,31 @@
 import os
-from typing import List
+import atexit
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
 from langchain_community.document_loaders import (
-    UnstructuredMarkdownLoader,
     CSVLoader,
     UnstructuredPDFLoader,
     TextLoader
 )
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
 from langchain_core.documents import Document
 
+# Markdown heading levels used as chunk boundaries, with their metadata keys
+MARKDOWN_HEADERS = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+
+# Pages with less extracted text than this are treated as scanned (no text layer)
+PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "20"))
+# Worker processes for text-layer extraction, and the page count below which it runs inline
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
 def get_department_from_path(file_path):
     """
     Extracts the department name from the file path based on the folder
@@ -21,6 +38,147 @@ def get_department_from_path(file_path):
             return parts[idx + 1].lower()
     return "general"
 
+def _extract_pdf_text(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Text layer of pages [start, end); runs in a worker process for large PDFs."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    pages = []
+    for index in range(start, end):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception as e:
+            print(f"  Warning: text extraction failed on page {index + 1} of {file_path}: {e}")
+            text = ""
+        pages.append((index, text))
+    return pages
+
+def _load_scanned_pdf_page(file_path: str, index: int) -> str:
+    """Run the (slow) unstructured pipeline on a single page without a text layer."""
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter()
+    writer.add_page(PdfReader(file_path).pages[index])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        page_path = os.path.join(tmp_dir, "page.pdf")
+        with open(page_path, "wb") as f:
+            writer.write(f)
+        return "\n\n".join(doc.page_content for doc in UnstructuredPDFLoader(page_path).load())
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Worker processes shared by every PDF; started on first use and shut down at exit."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawned workers: loading can run inside the threaded API process
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pdf_pool.shutdown)
+        return _pdf_pool
+
+def _reset_pdf_pool():
+    """Drop a pool whose worker died, so the next PDF starts a fresh one."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False)
+            _pdf_pool = None
+
+def load_pdf_pages(file_path: str, workers: Optional[int] = None) -> List[Document]:
+    """
+    Tiered PDF loading: fast text-layer extraction per page (spread over the shared worker
+    processes for large files), with UnstructuredPDFLoader only for pages that have no text
+    layer (also run on the workers when there are several).
+    Returns one Document per non-empty page, with its 1-based page number in 'page'.
+    """
+    from pypdf import PdfReader
+    page_count = len(PdfReader(file_path).pages)
+    workers = max(1, min(workers or PDF_WORKERS, PDF_WORKERS, page_count))
+
+    pages = None
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        step = -(-page_count // workers)
+        try:
+            pool = _get_pdf_pool()
+            futures = [
+                pool.submit(_extract_pdf_text, file_path, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            pages = [page for future in futures for page in future.result()]
+        except BrokenProcessPool as e:
+            print(f"  Warning: PDF worker pool failed on {file_path} ({e}); extracting inline")
+            _reset_pdf_pool()
+    if pages is None:
+        pages = _extract_pdf_text(file_path, 0, page_count)
+
+    texts = dict(pages)
+    scanned = [index for index, text in pages if len(text.strip()) < PDF_MIN_PAGE_CHARS]
+    scanned_futures = {}
+    if workers > 1 and len(scanned) > 1:
+        try:
+            pool = _get_pdf_pool()
+            scanned_futures = {index: pool.submit(_load_scanned_pdf_page, file_path, index) for index in scanned}
+        except BrokenProcessPool:
+            _reset_pdf_pool()
+    for index in scanned:
+        try:
+            future = scanned_futures.get(index)
+            texts[index] = future.result() if future is not None else _load_scanned_pdf_page(file_path, index)
+        except Exception as e:
+            print(f"  Warning: could not extract page {index + 1} of {file_path}: {e}")
+            texts[index] = ""
+    if scanned:
+        print(f"  {len(scanned)} of {page_count} pages had no text layer and used the unstructured loader")
+
+    return [
+        Document(page_content=text, metadata={'page': index + 1, 'total_pages': page_count})
+        for index, text in sorted(texts.items())
+        if text.strip()
+    ]
+
+def split_markdown_by_headers(docs: List[Document], text_splitter: RecursiveCharacterTextSplitter,
+                              chunk_size: int = 1500) -> List[Document]:
+    """
+    Chunk Markdown on heading boundaries. Adjacent sibling sections (same parent heading)
+    are merged up to chunk_size, so runs of short sections become one complete chunk;
+    oversized sections are split further. Chunks are prefixed with and tagged by their
+    heading path, e.g. "Q1 2024 > Campaign Metrics".
+    """
+    header_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=MARKDOWN_HEADERS, strip_headers=True)
+    chunks = []
+    for doc in docs:
+        # Groups of consecutive sibling sections: [parent path, [(title, section)], length]
+        groups = []
+        for section in header_splitter.split_text(doc.page_content):
+            path = [section.metadata[key] for _, key in MARKDOWN_HEADERS if key in section.metadata]
+            parent, title = path[:-1], (path[-1] if path else "")
+            length = len(title) + len(section.page_content) + 2
+            if groups and groups[-1][0] == parent and groups[-1][2] + length <= chunk_size:
+                groups[-1][1].append((title, section))
+                groups[-1][2] += length
+            else:
+                groups.append([parent, [(title, section)], length])
+
+        for parent, members, _ in groups:
+            if len(members) == 1:
+                title, section = members[0]
+                path = " > ".join(parent + [title] if title else parent)
+                metadata = {**doc.metadata, **section.metadata, 'section': path}
+                text = section.page_content
+            else:
+                path = " > ".join(parent)
+                # Keep only the shared heading levels of the merged siblings
+                first = members[0][1].metadata
+                present = [key for _, key in MARKDOWN_HEADERS if key in first]
+                shared = {key: first[key] for key in present[:len(parent)]}
+                metadata = {**doc.metadata, **shared, 'section': path,
+                            'subsections': ", ".join(title for title, _ in members if title)}
+                text = "\n\n".join(
+                    f"{title}\n{section.page_content}" if title else section.page_content
+                    for title, section in members
+                )
+            for piece in text_splitter.split_text(text):
+                content = f"{path}\n\n{piece}" if path else piece
+                chunks.append(Document(page_content=content, metadata=dict(metadata)))
+    return chunks
+
 def load_and_split_documents(file_paths: List[str], chunk_size: int = 1500, chunk_overlap: int = 150) -> List[Document]:
     """
     Load and process documents from various file types: PDF, Markdown, TXT, and CSV.
@@ -48,7 +206,8 @@ def load_and_split_documents(file_paths: List[str], chunk_size: int = 1500, chun
         try:
             # Load documents based on file type
             if ext in ['.md', '.markdown']:
-                loader = UnstructuredMarkdownLoader(file_path)
+                # Load raw Markdown so headings survive for structure-aware splitting
+                loader = TextLoader(file_path, encoding='utf-8')
                 docs = loader.load()
                 print(f"  Loaded {len(docs)} markdown documents")
                 
@@ -58,9 +217,8 @@ def load_and_split_documents(file_paths: List[str], chunk_size: int = 1500, chun
                 print(f"  Loaded {len(docs)} text documents")
                 
             elif ext == '.pdf':
-                loader = UnstructuredPDFLoader(file_path)
-                docs = loader.load()
-                print(f"  Loaded {len(docs)} PDF documents")
+                docs = load_pdf_pages(file_path)
+                print(f"  Loaded {len(docs)} PDF pages")
                 
             elif ext == '.csv':
                 loader = CSVLoader(file_path=file_path)
@@ -94,6 +252,10 @@ def load_and_split_documents(file_paths: List[str], chunk_size: int = 1500, chun
             # CSV files are already row-based, don't split further
             all_docs.extend(docs)
             print(f"  Added {len(docs)} CSV rows without splitting")
+        elif ext in ['.md', '.markdown']:
+            split_docs = split_markdown_by_headers(docs, text_splitter, chunk_size)
+            all_docs.extend(split_docs)
+            print(f"  Split into {len(split_docs)} section chunks")
         else:
             # Split text-based documents
             split_docs = text_splitter.split_documents(docs)
@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import argparse
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Supported embedding backends:
+#   torch     - default PyTorch sentence-transformers model (fp32 baseline)
+#   onnx      - same model exported to ONNX Runtime (fp32)
+#   onnx-int8 - ONNX export with dynamic int8 quantization
+#   distilled - smaller distilled model on PyTorch
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8", "distilled")
+DISTILLED_MODEL = "all-MiniLM-L6-v2"
+ONNX_CACHE_DIR = "./onnx_models"
+
+
+def _hub_model_id(model_name: str) -> str:
+    """Sentence-transformers short names need their org prefix outside of SentenceTransformer."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings served by ONNX Runtime on CPU, with optional dynamic int8 quantization.
+    Mean pooling and L2 normalization match the sentence-transformers mpnet/MiniLM pipelines.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, num_threads: Optional[int] = None,
+                 cache_dir: str = ONNX_CACHE_DIR, batch_size: int = 32, max_length: int = 384):
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.model_id = _hub_model_id(model_name)
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+        export_dir = os.path.join(cache_dir, self.model_id.replace("/", "__"))
+        file_name = "model_quantized.onnx" if quantize else "model.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            self._export(export_dir, quantize)
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+            session_options.inter_op_num_threads = 1
+
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            export_dir,
+            file_name=file_name,
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+
+    def _export(self, export_dir: str, quantize: bool):
+        """Export the model to ONNX once and cache it on disk, optionally quantized."""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        logger.info(f"Exporting {self.model_id} to ONNX in {export_dir}")
+        model = ORTModelForFeatureExtraction.from_pretrained(self.model_id, export=True)
+        model.save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(self.model_id).save_pretrained(export_dir)
+
+        if quantize:
+            logger.info(f"Applying dynamic int8 quantization to {self.model_id}")
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=export_dir, quantization_config=qconfig)
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            inputs = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+            )
+            outputs = self.model(**inputs)
+            token_embeddings = np.asarray(outputs.last_hidden_state)
+
+            # Mean pooling over non-padding tokens, then L2 normalization
+            mask = inputs["attention_mask"][..., None].astype(token_embeddings.dtype)
+            summed = (token_embeddings * mask).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+
+def get_embeddings(model_name: str = "all-mpnet-base-v2", backend: str = "torch",
+                   num_threads: Optional[int] = None) -> Embeddings:
+    """
+    Build the embedding function for the selected CPU backend.
+    """
+    backend = backend.lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embeddings backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+    if backend in ("torch", "distilled"):
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        name = DISTILLED_MODEL if backend == "distilled" else model_name
+        return HuggingFaceEmbeddings(model_name=name)
+
+    return OnnxEmbeddings(model_name, quantize=(backend == "onnx-int8"), num_threads=num_threads)
+
+
+def get_embeddings_id(model_name: str = "all-mpnet-base-v2", backend: str = "torch") -> str:
+    """
+    Stable identifier of the vector space produced by a backend; vectors are only comparable within one id.
+    """
+    backend = backend.lower()
+    if backend == "distilled":
+        return DISTILLED_MODEL
+    if backend == "torch":
+        return model_name
+    return f"{model_name}@{backend}"
+
+
+def _top_k(query_vectors: np.ndarray, corpus_vectors: np.ndarray, k: int) -> List[set]:
+    scores = query_vectors @ corpus_vectors.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def evaluate_recall(baseline: Embeddings, candidate: Embeddings, corpus: List[str], queries: List[str], k: int = 3) -> dict:
+    """
+    Compare a candidate backend against the fp32 baseline: recall@k of the baseline's
+    top-k neighbours and corpus embedding throughput of both.
+    """
+    start = time.perf_counter()
+    base_corpus = np.asarray(baseline.embed_documents(corpus))
+    base_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cand_corpus = np.asarray(candidate.embed_documents(corpus))
+    cand_seconds = time.perf_counter() - start
+
+    base_queries = np.asarray([baseline.embed_query(q) for q in queries])
+    cand_queries = np.asarray([candidate.embed_query(q) for q in queries])
+
+    base_hits = _top_k(base_queries, base_corpus, k)
+    cand_hits = _top_k(cand_queries, cand_corpus, k)
+    recalls = [len(b & c) / len(b) for b, c in zip(base_hits, cand_hits) if b]
+
+    return {
+        "recall_at_k": float(np.mean(recalls)) if recalls else 0.0,
+        "k": k,
+        "baseline_docs_per_sec": len(corpus) / base_seconds if base_seconds else 0.0,
+        "candidate_docs_per_sec": len(corpus) / cand_seconds if cand_seconds else 0.0,
+        "speedup": base_seconds / cand_seconds if cand_seconds else 0.0,
+    }
+
+
+DEFAULT_EVAL_QUERIES = [
+    "What is the leave policy for employees?",
+    "What was the revenue growth last quarter?",
+    "Which marketing campaigns performed best in Q1 2024?",
+    "Describe the system architecture and tech stack",
+    "What are the main operating expenses?",
+    "How is customer acquisition cost trending?",
+]
+
+if __name__ == "__main__":
+    from document_loader import load_and_split_documents
+
+    parser = argparse.ArgumentParser(description="Check recall and speed of an embeddings backend against the fp32 baseline.")
+    parser.add_argument("--backend", default="onnx-int8", choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--model", default="all-mpnet-base-v2")
+    parser.add_argument("--data-root", default="data")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--queries", help="Optional file with one evaluation query per line")
+    args = parser.parse_args()
+
+    files = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(args.data_root)
+        for name in names
+        if name.endswith(('.pdf', '.md', '.txt', '.markdown'))
+    ]
+    corpus = [doc.page_content for doc in load_and_split_documents(files)]
+
+    queries = DEFAULT_EVAL_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    baseline = get_embeddings(args.model, "torch", args.threads)
+    candidate = get_embeddings(args.model, args.backend, args.threads)
+    report = evaluate_recall(baseline, candidate, corpus, queries, k=args.k)
+
+    print(f"Backend: {args.backend} ({len(corpus)} chunks, {len(queries)} queries)")
+    print(f"  recall@{report['k']}: {report['recall_at_k']:.3f}")
+    print(f"  baseline: {report['baseline_docs_per_sec']:.1f} docs/s")
+    print(f"  candidate: {report['candidate_docs_per_sec']:.1f} docs/s ({report['speedup']:.2f}x)")
@@ -0,0 +1,168 @@
+import os
+import hmac
+import uuid
+import ipaddress
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from vector_store import VectorStoreManager
+from profiles import distance_to_similarity
+from router import DepartmentRouter
+
+# Index server owning a subset of departments, searched by the API over HTTP:
+#   python index_server.py --port 8101 --departments finance,general
+#   python index_server.py --port 8102 --departments hr,marketing,engineering
+#   INDEX_SHARDS="http://localhost:8101=finance,general;http://localhost:8102=hr,marketing,engineering" uvicorn main:app
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+app = FastAPI(title="RBAC RAG Index Shard")
+
+SHARD_DEPARTMENTS = [d.strip().lower() for d in os.getenv("SHARD_DEPARTMENTS", "").split(",") if d.strip()]
+INDEX_SHARD_TOKEN = os.getenv("INDEX_SHARD_TOKEN")
+
+# Identifies this process in generation tokens, so a restarted shard never reuses one
+INSTANCE_ID = uuid.uuid4().hex[:8]
+
+manager = VectorStoreManager()
+# A shard always serves its own departments locally
+if manager.shards is not None:
+    manager.shards.close()
+manager.shards = None
+# Centroids are served to the API's router even if this process doesn't route itself
+centroid_source = manager.router or DepartmentRouter(manager)
+
+
+class SearchRequest(BaseModel):
+    query_vector: List[float]
+    departments: List[str]
+    k: int = 12
+    embeddings_id: Optional[str] = None
+
+
+def is_loopback(host: Optional[str]) -> bool:
+    if host in ("localhost",):
+        return True
+    try:
+        return ipaddress.ip_address(host or "").is_loopback
+    except ValueError:
+        return False
+
+
+def check_token(request: Request, token: Optional[str]):
+    """
+    Shards return chunks of every department they own without RBAC checks, so only the
+    API may call them: with INDEX_SHARD_TOKEN set it must be presented; without it,
+    only loopback clients are served.
+    """
+    if INDEX_SHARD_TOKEN:
+        if not hmac.compare_digest(token or "", INDEX_SHARD_TOKEN):
+            raise HTTPException(status_code=401, detail="Invalid shard token")
+    elif not is_loopback(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="INDEX_SHARD_TOKEN is required for non-local clients")
+
+
+def generation_token(department: str) -> str:
+    return f"{INSTANCE_ID}:{manager.get_generation(department)}"
+
+
+@app.on_event("startup")
+async def load_owned_departments():
+    """Restore snapshots if configured, then load or build the owned stores in the background."""
+    snapshot_dir = os.getenv("SNAPSHOT_DIR")
+    if snapshot_dir:
+        manager.restore_snapshots(snapshot_dir)
+    threading.Thread(target=manager.warm_up, args=(SHARD_DEPARTMENTS,), name="shard-warm-up", daemon=True).start()
+    logger.info(f"Index shard {INSTANCE_ID} serving: {SHARD_DEPARTMENTS}")
+
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "departments": SHARD_DEPARTMENTS, "embeddings_id": manager.embeddings_id}
+
+
+@app.get("/generations")
+async def get_generations(request: Request, x_shard_token: Optional[str] = Header(None)) -> Dict[str, str]:
+    check_token(request, x_shard_token)
+    return {dept: generation_token(dept) for dept in SHARD_DEPARTMENTS}
+
+
+@app.get("/centroids")
+def get_centroids(request: Request, departments: List[str] = Query(...), x_shard_token: Optional[str] = Header(None)):
+    """
+    Routing centroids of owned departments, with the generation they were computed for;
+    null centroids for departments with no index yet.
+    """
+    check_token(request, x_shard_token)
+    results = {}
+    for dept in (d.lower() for d in departments):
+        if dept not in SHARD_DEPARTMENTS:
+            raise HTTPException(status_code=404, detail=f"Department not served by this shard: {dept}")
+        centroids = centroid_source.get_centroids(dept)
+        results[dept] = {
+            "generation": generation_token(dept),
+            "centroids": centroids.tolist() if centroids is not None else None,
+        }
+    return {"departments": results}
+
+
+@app.post("/search")
+def search(search_data: SearchRequest, request: Request, x_shard_token: Optional[str] = Header(None)):
+    """
+    Top-k chunks per requested department for an already embedded query.
+    """
+    check_token(request, x_shard_token)
+    if search_data.embeddings_id and search_data.embeddings_id != manager.embeddings_id:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Embeddings mismatch: shard uses {manager.embeddings_id}, query uses {search_data.embeddings_id}"
+        )
+    departments = [dept.lower() for dept in search_data.departments]
+    foreign = [dept for dept in departments if dept not in SHARD_DEPARTMENTS]
+    if foreign:
+        raise HTTPException(status_code=404, detail=f"Departments not served by this shard: {foreign}")
+
+    results = {}
+    # Held, so a concurrent reindex swap can't stop a store under the search
+    with manager.held_vectorstores(departments) as stores:
+        for dept in departments:
+            vectorstore = stores.get(dept)
+            hits = []
+            if vectorstore is not None:
+                found = vectorstore.similarity_search_by_vector_with_relevance_scores(search_data.query_vector, k=search_data.k)
+                hits = [
+                    {
+                        "id": getattr(doc, "id", None),
+                        "text": doc.page_content,
+                        "metadata": doc.metadata,
+                        "score": distance_to_similarity(distance),
+                    }
+                    for doc, distance in found
+                ]
+            results[dept] = {"generation": generation_token(dept), "results": hits}
+    return {"departments": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve searches over a subset of department indexes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--departments", default=",".join(SHARD_DEPARTMENTS))
+    args = parser.parse_args()
+
+    SHARD_DEPARTMENTS[:] = [d.strip().lower() for d in args.departments.split(",") if d.strip()]
+    if not SHARD_DEPARTMENTS:
+        parser.error("no departments given (--departments or SHARD_DEPARTMENTS)")
+    if not INDEX_SHARD_TOKEN and not is_loopback(args.host):
+        parser.error(f"refusing to listen on {args.host} without INDEX_SHARD_TOKEN")
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from document_loader import load_and_split_documents
+from dedup import deduplicate_documents
+from store_cache import release_chroma_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within a process
+    fcntl = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIRNAME = ".ingest"
+# Written into an index directory when a build finishes; changes with every build
+BUILD_STAMP_FILENAME = ".build_id"
+
+
+def _write_json_atomic(path: str, data: Dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def chunk_id(doc: Document, occurrence: int = 0) -> str:
+    """Deterministic chunk id, so re-adding a batch after a crash is idempotent."""
+    key = f"{doc.metadata.get('full_path', '')}\n{doc.page_content}"
+    if occurrence:
+        key += f"\n{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_ids(docs: List[Document]) -> List[str]:
+    """Ids for a department's chunks; repeated identical chunks (dedup disabled) stay distinct."""
+    seen: Dict[str, int] = {}
+    ids = []
+    for doc in docs:
+        base = chunk_id(doc)
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        ids.append(chunk_id(doc, occurrence) if occurrence else base)
+    return ids
+
+
+def _reset_index_dir(persist_dir: str):
+    release_chroma_path(persist_dir)
+    if os.path.exists(persist_dir):
+        shutil.rmtree(persist_dir)
+    os.makedirs(persist_dir, exist_ok=True)
+
+
+class Throughput:
+    """Running files/s, chunks/s and embeddings/s counters for progress output."""
+
+    def __init__(self, department: str):
+        self.department = department
+        self.start = time.perf_counter()
+        self.files = 0
+        self.chunks = 0
+        self.embeddings = 0
+
+    def report(self, stage: str, done: int, total: int):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        print(
+            f"[{self.department}] {stage} {done}/{total} | "
+            f"{self.files / elapsed:.2f} files/s, {self.chunks / elapsed:.1f} chunks/s, "
+            f"{self.embeddings / elapsed:.1f} embeddings/s"
+        )
+
+
+class IngestionCheckpoint:
+    def __init__(self, checkpoint_dir: str):
+        """
+        On-disk progress of one department build: parsed chunks per source file and the
+        number of embedding batches already written to the index.
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.chunks_dir = os.path.join(checkpoint_dir, "chunks")
+        self.state_path = os.path.join(checkpoint_dir, "state.json")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        self.state = {"files": {}, "embedded_batches": 0, "batch_size": None, "total_chunks": None, "complete": False}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state.update(json.load(f))
+
+    def save(self):
+        _write_json_atomic(self.state_path, self.state)
+
+    def reset(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        self.__init__(self.checkpoint_dir)
+
+    def _chunks_path(self, file_path: str) -> str:
+        return os.path.join(self.chunks_dir, hashlib.sha256(file_path.encode("utf-8")).hexdigest()[:32] + ".jsonl")
+
+    def load_file_chunks(self, file_path: str) -> Optional[List[Document]]:
+        """Cached chunks of a file, if it was parsed before and has not changed since."""
+        if self.state["files"].get(file_path) != file_fingerprint(file_path):
+            return None
+        path = self._chunks_path(file_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return [Document(page_content=r["page_content"], metadata=r["metadata"]) for r in map(json.loads, f)]
+
+    def save_file_chunks(self, file_path: str, docs: List[Document]):
+        path = self._chunks_path(file_path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+        self.state["files"][file_path] = file_fingerprint(file_path)
+        self.save()
+
+
+def write_build_stamp(persist_dir: str) -> str:
+    stamp = uuid.uuid4().hex
+    _write_json_atomic(os.path.join(persist_dir, BUILD_STAMP_FILENAME), {"build_id": stamp, "built_at": time.time()})
+    return stamp
+
+
+def read_build_stamp(persist_dir: str) -> str:
+    """Build id of the index in persist_dir ("" for missing or pre-stamp indexes)."""
+    try:
+        with open(os.path.join(persist_dir, BUILD_STAMP_FILENAME), encoding="utf-8") as f:
+            return json.load(f).get("build_id", "")
+    except (OSError, ValueError):
+        return ""
+
+
+_build_locks: Dict[str, threading.RLock] = {}
+_build_lock_files: Dict[str, List] = {}
+_build_locks_guard = threading.Lock()
+
+
+@contextmanager
+def department_build_lock(persist_root: str, department: str):
+    """
+    Exclusive lock on building or swapping a department's index, shared by every process
+    using the same persist directory (ingest CLI, reindex workers, API): an flock on
+    .ingest/<department>.lock. Re-entrant within a thread; other threads wait.
+    """
+    path = os.path.join(persist_root, CHECKPOINT_DIRNAME, f"{department.lower()}.lock")
+    with _build_locks_guard:
+        local = _build_locks.setdefault(path, threading.RLock())
+    with local:
+        entry = _build_lock_files.get(path)
+        if entry is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT)
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            entry = _build_lock_files[path] = [fd, 0]
+        entry[1] += 1
+        try:
+            yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _build_lock_files[path]
+                if fcntl is not None:
+                    fcntl.flock(entry[0], fcntl.LOCK_UN)
+                os.close(entry[0])
+
+
+def checkpoint_dir_for(persist_dir: str) -> str:
+    return os.path.join(os.path.dirname(persist_dir), CHECKPOINT_DIRNAME, os.path.basename(persist_dir))
+
+
+def build_incomplete(persist_dir: str) -> bool:
+    """True if a checkpointed build into persist_dir started but never finished."""
+    state_path = os.path.join(checkpoint_dir_for(persist_dir), "state.json")
+    if not os.path.exists(state_path):
+        return False
+    with open(state_path, encoding="utf-8") as f:
+        return not json.load(f).get("complete", False)
+
+
+def ingest_department(manager, department: str, persist_dir: Optional[str] = None, batch_size: int = 64,
+                      fresh: bool = False, on_progress: Optional[Callable[[Dict], None]] = None) -> Optional[Chroma]:
+    """
+    Build (or resume building) a department index. Parsed files and embedded batches are
+    checkpointed next to the index, so a crashed build continues where it stopped.
+    Runs under the department's build lock, so no other process builds it at the same time.
+    Returns the vector store, or None if the department has no documents.
+    """
+    department = department.lower()
+    persist_dir = persist_dir or os.path.join(manager.persist_dir, department)
+    with department_build_lock(manager.persist_dir, department):
+        return _ingest_department(manager, department, persist_dir, batch_size, fresh, on_progress)
+
+
+def _ingest_department(manager, department: str, persist_dir: str, batch_size: int, fresh: bool,
+                       on_progress: Optional[Callable[[Dict], None]]) -> Optional[Chroma]:
+    checkpoint = IngestionCheckpoint(checkpoint_dir_for(persist_dir))
+    progress = Throughput(department)
+
+    def notify(stage: str, done: int, total: int):
+        progress.report(stage, done, total)
+        if on_progress:
+            on_progress({"stage": stage, "done": done, "total": total, "files": progress.files,
+                         "chunks": progress.chunks, "embeddings": progress.embeddings})
+
+    file_paths = sorted(manager._get_department_files(department))
+    if not file_paths:
+        logger.warning(f"No files found for department: {department}")
+        return None
+
+    changed = set(checkpoint.state["files"]) != set(file_paths) or any(
+        checkpoint.state["files"][p] != file_fingerprint(p) for p in file_paths if p in checkpoint.state["files"]
+    )
+    if fresh or checkpoint.state["complete"] or checkpoint.state["batch_size"] not in (None, batch_size) \
+            or (changed and checkpoint.state["embedded_batches"]):
+        checkpoint.reset()
+
+    # Stage 1: parse and split files, reusing chunks from earlier runs
+    dept_docs = []
+    for done, file_path in enumerate(file_paths, 1):
+        docs = checkpoint.load_file_chunks(file_path)
+        if docs is None:
+            docs = [d for d in load_and_split_documents([file_path]) if d.metadata.get('department', '').lower() == department]
+            checkpoint.save_file_chunks(file_path, docs)
+        dept_docs.extend(docs)
+        progress.files += 1
+        progress.chunks += len(docs)
+        notify("files", done, len(file_paths))
+
+    if not dept_docs:
+        logger.warning(f"No documents found for department: {department}")
+        return None
+
+    # Collapse near-duplicate chunks (overlapping reports, splitter overlap)
+    if os.getenv("DEDUP_ENABLED", "true").lower() == "true":
+        dept_docs, stats = deduplicate_documents(dept_docs, threshold=float(os.getenv("DEDUP_THRESHOLD", "0.8")))
+        logger.info(
+            f"Deduplicated {department}: {stats['input']} -> {stats['output']} chunks "
+            f"({stats['dedup_ratio']:.1%} removed)"
+        )
+
+    # Stage 2: embed and write in batches, skipping batches finished before a crash
+    ids = chunk_ids(dept_docs)
+    resume_from = checkpoint.state["embedded_batches"]
+    if resume_from and not (os.path.isdir(persist_dir) and os.listdir(persist_dir)):
+        logger.warning(f"Index for {department} is gone; re-embedding from the first batch")
+        resume_from = 0
+    if resume_from == 0:
+        _reset_index_dir(persist_dir)
+    vectorstore = Chroma(
+        collection_name=f"dept_{department}",
+        embedding_function=manager.embeddings,
+        persist_directory=persist_dir
+    )
+    if resume_from:
+        # Only trust the checkpoint if the index holds exactly the batches it claims
+        expected = len(set(ids[:resume_from * batch_size]))
+        found = vectorstore._collection.count()
+        if found != expected:
+            logger.warning(f"Index for {department} has {found} chunks, checkpoint expects {expected}; re-embedding")
+            del vectorstore
+            _reset_index_dir(persist_dir)
+            vectorstore = Chroma(
+                collection_name=f"dept_{department}",
+                embedding_function=manager.embeddings,
+                persist_directory=persist_dir
+            )
+            resume_from = 0
+
+    total_batches = (len(dept_docs) + batch_size - 1) // batch_size
+    checkpoint.state.update(batch_size=batch_size, total_chunks=len(dept_docs), embedded_batches=resume_from)
+    for batch_index in range(resume_from, total_batches):
+        batch = dept_docs[batch_index * batch_size:(batch_index + 1) * batch_size]
+        texts = [doc.page_content for doc in batch]
+        vectorstore._collection.upsert(
+            ids=ids[batch_index * batch_size:(batch_index + 1) * batch_size],
+            embeddings=manager.embeddings.embed_documents(texts),
+            documents=texts,
+            metadatas=[doc.metadata for doc in batch]
+        )
+        checkpoint.state["embedded_batches"] = batch_index + 1
+        checkpoint.save()
+        progress.embeddings += len(batch)
+        notify("batches", batch_index + 1, total_batches)
+
+    write_build_stamp(persist_dir)
+    checkpoint.state["complete"] = True
+    checkpoint.save()
+    logger.info(f"Created vector store for {department} with {len(dept_docs)} documents")
+    return vectorstore
+
+
+if __name__ == "__main__":
+    from vector_store import VectorStoreManager
+
+    parser = argparse.ArgumentParser(description="Index departments with checkpointing; rerun the same command to resume.")
+    parser.add_argument("--departments", nargs="*", help="Departments to index (default: every folder under data/)")
+    parser.add_argument("--data-root", default="data")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--fresh", action="store_true", help="Discard checkpoints and rebuild from scratch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manager = VectorStoreManager(data_root=args.data_root)
+    departments = args.departments or manager.get_available_departments()
+
+    started = time.perf_counter()
+    for department in departments:
+        department = department.lower()
+        # Build next to the live index, which a running API keeps serving, then swap it in;
+        # the fixed staging name lets a rerun resume an interrupted build
+        staging_dir = os.path.join(manager.persist_dir, f"{department}.staging")
+        with department_build_lock(manager.persist_dir, department):
+            vectorstore = ingest_department(manager, department, persist_dir=staging_dir, batch_size=args.batch_size, fresh=args.fresh)
+            if vectorstore is not None:
+                del vectorstore
+                manager.swap_in_index(department, staging_dir)
+    print(f"Indexed {len(departments)} department(s) in {time.perf_counter() - started:.1f}s")
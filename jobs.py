@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Worker processes keep one manager (and its embedding model) for their lifetime
+_worker_manager = None
+
+
+def _write_progress(path: str, data: Dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def build_department_index(department: str, data_root: str, staging_dir: str, progress_path: str) -> Dict:
+    """
+    Runs in a worker process: build a department index into staging_dir from scratch,
+    reporting progress to a JSON file that the API process polls.
+    """
+    global _worker_manager
+    from vector_store import VectorStoreManager
+    from ingest import ingest_department
+
+    started = time.time()
+    _write_progress(progress_path, {"stage": "loading", "started_at": started})
+    if _worker_manager is None:
+        _worker_manager = VectorStoreManager(data_root=data_root)
+
+    def on_progress(progress: Dict):
+        _write_progress(progress_path, dict(progress, started_at=started))
+
+    vectorstore = ingest_department(_worker_manager, department, persist_dir=staging_dir, fresh=True, on_progress=on_progress)
+    if vectorstore is None:
+        raise ValueError(f"No documents found for department: {department}")
+    return {"chunks": vectorstore._collection.count(), "started_at": started, "build_seconds": time.time() - started}
+
+
+class ReindexJob:
+    def __init__(self, department: str, staging_dir: str, progress_path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.department = department
+        self.staging_dir = staging_dir
+        self.progress_path = progress_path
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self.swap_seconds: Optional[float] = None
+        self.chunks: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        progress = {}
+        if self.status in ("queued", "running") and os.path.exists(self.progress_path):
+            try:
+                with open(self.progress_path, encoding="utf-8") as f:
+                    progress = json.load(f)
+            except (OSError, ValueError):
+                pass
+        started_at = self.started_at or progress.get("started_at")
+        status = "running" if self.status == "queued" and started_at else self.status
+        return {
+            "job_id": self.id,
+            "department": self.department,
+            "status": status,
+            "progress": progress,
+            "submitted_at": self.submitted_at,
+            "started_at": started_at,
+            "finished_at": self.finished_at,
+            "build_seconds": self.build_seconds,
+            "swap_seconds": self.swap_seconds,
+            "chunks": self.chunks,
+            "error": self.error,
+        }
+
+
+class ReindexJobManager:
+    def __init__(self, manager, max_workers: int = 1, max_history: int = 100,
+                 on_swap: Optional[Callable[[str], None]] = None):
+        """
+        Runs department reindex jobs in a separate process pool, so builds never compete
+        with the serving event loop or its GIL, and swaps finished indexes in atomically.
+        on_swap(department) is called after each successful swap.
+        """
+        self.manager = manager
+        self.on_swap = on_swap
+        self.max_history = max_history
+        # Spawned (not forked) workers don't inherit the API's threads and model state
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.jobs: Dict[str, ReindexJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, department: str) -> ReindexJob:
+        """Enqueue a reindex; an already pending job for the same department is reused."""
+        department = department.lower()
+        with self._lock:
+            for job in self.jobs.values():
+                if job.department == department and job.status in ("queued", "running"):
+                    return job
+
+            staging_dir = os.path.join(self.manager.persist_dir, f"{department}.staging-{uuid.uuid4().hex[:8]}")
+            job = ReindexJob(department, staging_dir, f"{staging_dir}.progress.json")
+            self.jobs[job.id] = job
+            self._trim_history()
+
+        future = self.executor.submit(
+            build_department_index, department, self.manager.data_root, job.staging_dir, job.progress_path
+        )
+        future.add_done_callback(lambda f: self._finish(job, f))
+        logger.info(f"Queued reindex job {job.id} for {department}")
+        return job
+
+    def _finish(self, job: ReindexJob, future: Future):
+        try:
+            result = future.result()
+            job.status = "swapping"
+            job.started_at = result["started_at"]
+            job.build_seconds = result["build_seconds"]
+            job.chunks = result["chunks"]
+
+            swap_started = time.perf_counter()
+            self.manager.swap_in_index(job.department, job.staging_dir)
+            job.swap_seconds = time.perf_counter() - swap_started
+            job.status = "succeeded"
+            logger.info(f"Reindex job {job.id} for {job.department} finished with {job.chunks} chunks")
+            if self.on_swap is not None:
+                try:
+                    self.on_swap(job.department)
+                except Exception as e:
+                    logger.error(f"Post-swap hook for {job.department} failed: {e}")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Reindex job {job.id} for {job.department} failed: {e}")
+            from ingest import checkpoint_dir_for
+            shutil.rmtree(job.staging_dir, ignore_errors=True)
+            # The build's parsed-chunk checkpoint lives next to it, under .ingest/
+            shutil.rmtree(checkpoint_dir_for(job.staging_dir), ignore_errors=True)
+        finally:
+            job.finished_at = time.time()
+            if os.path.exists(job.progress_path):
+                os.remove(job.progress_path)
+
+    def _trim_history(self):
+        finished = [job for job in self.jobs.values() if job.status in ("succeeded", "failed")]
+        for job in sorted(finished, key=lambda j: j.submitted_at)[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[ReindexJob]:
+        return self.jobs.get(job_id)
+
+    def list(self) -> List[ReindexJob]:
+        return sorted(self.jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,93 @@
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import List, Optional
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+# Local OpenAI-compatible stand-in for OpenRouter, used for load and latency testing:
+#   python llm_stub.py --port 9100 --latency 0.4 --tokens-per-sec 60
+#   OPENROUTER_API_BASE=http://localhost:9100/v1 OPENROUTER_API_KEY=stub uvicorn main:app
+
+app = FastAPI(title="LLM Stub")
+
+settings = {
+    "latency": 0.4,           # time to first token, seconds
+    "jitter": 0.1,            # uniform +/- jitter on latency, seconds
+    "tokens_per_sec": 60.0,   # generation speed
+    "completion_tokens": 150, # tokens per answer
+    "slow_fraction": 0.0,     # share of requests that take slow_latency extra
+    "slow_latency": 5.0,
+}
+
+WORDS = ("the revenue policy team quarter growth report employee leave campaign "
+         "metric system platform customer budget review result").split()
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatCompletionRequest(BaseModel):
+    model: str
+    messages: List[ChatMessage]
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    n: Optional[int] = 1
+    stream: Optional[bool] = False
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: ChatCompletionRequest):
+    tokens = min(request.max_tokens or settings["completion_tokens"], settings["completion_tokens"])
+    delay = settings["latency"] + random.uniform(-settings["jitter"], settings["jitter"])
+    if random.random() < settings["slow_fraction"]:
+        delay += settings["slow_latency"]
+    delay += tokens / settings["tokens_per_sec"]
+    await asyncio.sleep(max(delay, 0.0))
+
+    prompt_tokens = sum(len(m.content) for m in request.messages) // 4
+    content = " ".join(random.choice(WORDS) for _ in range(tokens))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": tokens,
+            "total_tokens": prompt_tokens + tokens,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub with configurable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=settings["latency"])
+    parser.add_argument("--jitter", type=float, default=settings["jitter"])
+    parser.add_argument("--tokens-per-sec", type=float, default=settings["tokens_per_sec"])
+    parser.add_argument("--completion-tokens", type=int, default=settings["completion_tokens"])
+    parser.add_argument("--slow-fraction", type=float, default=settings["slow_fraction"])
+    parser.add_argument("--slow-latency", type=float, default=settings["slow_latency"])
+    args = parser.parse_args()
+
+    settings.update(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        slow_fraction=args.slow_fraction,
+        slow_latency=args.slow_latency,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
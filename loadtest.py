@@ -0,0 +1,156 @@
+import csv
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Dict, List
+import httpx
+
+# Concurrent load generator for the RoleFlow API. Run the API against llm_stub.py, then:
+#   python loadtest.py --base-url http://localhost:8000 --stages 1,4,8,16,32 --stage-seconds 30
+
+DEFAULT_QUERIES = [
+    "What is the leave policy?",
+    "How many sick days do employees get?",
+    "Summarize the Q1 2024 marketing campaign results",
+    "What was the revenue growth in the last quarter?",
+    "Describe the engineering tech stack",
+    "What are the main operating expenses?",
+    "Which employees have the highest performance rating?",
+    "What is the customer acquisition cost trend?",
+]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        # Answered queries that went through the follow-up path (Server-Timing has a rewrite stage)
+        self.followups = 0
+
+    def record(self, endpoint: str, status: str, seconds: float):
+        self.statuses[endpoint][status] += 1
+        if status == "200":
+            self.latencies[endpoint].append(seconds)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def load_users(hr_path: str, count: int, seed: int) -> List[Dict[str, str]]:
+    """Pick real users so their access scopes vary (department mix, C-level IDs included)."""
+    with open(hr_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    rng = random.Random(seed)
+    rng.shuffle(rows)
+    return [{"full_name": row["full_name"], "department": row["department"]} for row in rows[:count]]
+
+
+async def timed_request(client: httpx.AsyncClient, stats: Stats, endpoint: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        stats.record(endpoint, str(response.status_code), time.perf_counter() - start)
+        return response
+    except httpx.HTTPError as e:
+        stats.record(endpoint, type(e).__name__, time.perf_counter() - start)
+        return None
+
+
+async def login_all(client: httpx.AsyncClient, stats: Stats, users: List[Dict[str, str]]) -> List[str]:
+    responses = await asyncio.gather(*[
+        timed_request(client, stats, "/login", "POST", "/login", json=user) for user in users
+    ])
+    return [r.json()["token"] for r in responses if r is not None and r.status_code == 200]
+
+
+async def worker(client: httpx.AsyncClient, stats: Stats, tokens: List[str], queries: List[str],
+                 stop_at: float, unique: bool, think_time: float, conversational: bool):
+    rng = random.Random()
+    while time.monotonic() < stop_at:
+        query = rng.choice(queries)
+        if unique:
+            # Defeat request coalescing and caches to measure raw capacity
+            query = f"{query} (#{rng.randrange(1_000_000)})"
+        headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+        if not conversational:
+            # The server remembers every answered turn per user; without this, all but the first
+            # query of a user would be follow-ups (extra rewrite call, no answer cache)
+            await timed_request(client, stats, "/conversation", "DELETE", "/conversation", headers=headers)
+        response = await timed_request(client, stats, "/query", "POST", "/query", headers=headers, json={"query": query})
+        if response is not None and response.status_code == 200 and "rewrite;" in response.headers.get("Server-Timing", ""):
+            stats.followups += 1
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, think_time))
+
+
+def print_report(concurrency: int, elapsed: float, stats: Stats):
+    print(f"\n=== concurrency {concurrency} ({elapsed:.1f}s) ===")
+    for endpoint in sorted(stats.statuses):
+        statuses = stats.statuses[endpoint]
+        total = sum(statuses.values())
+        ok = statuses.get("200", 0)
+        lat = stats.latencies[endpoint]
+        print(f"{endpoint}: {total} requests, {ok / elapsed:.2f} ok/s, error rate {(total - ok) / total:.1%}")
+        print(f"  latency p50={percentile(lat, 50):.3f}s p90={percentile(lat, 90):.3f}s "
+              f"p95={percentile(lat, 95):.3f}s p99={percentile(lat, 99):.3f}s max={max(lat, default=0):.3f}s")
+        errors = {status: n for status, n in statuses.items() if status != "200"}
+        if errors:
+            print(f"  errors: {dict(errors)}")
+        if endpoint == "/query" and ok:
+            # Users shared between workers can still race a turn in between clear and query
+            print(f"  follow-ups (history rewritten): {stats.followups} ({stats.followups / ok:.1%})")
+
+
+async def run(args):
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=max(args.stages) + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+        login_stats = Stats()
+        started = time.perf_counter()
+        tokens = await login_all(client, login_stats, load_users(args.hr_data, args.users, args.seed))
+        print_report(args.users, time.perf_counter() - started, login_stats)
+        if not tokens:
+            print("No users could log in; aborting")
+            return
+
+        print(f"Mode: {'conversational (history kept)' if args.conversational else 'standalone (history cleared before each query)'}")
+        for concurrency in args.stages:
+            stats = Stats()
+            started = time.perf_counter()
+            stop_at = time.monotonic() + args.stage_seconds
+            await asyncio.gather(*[
+                worker(client, stats, tokens, queries, stop_at, args.unique_queries, args.think_time, args.conversational)
+                for _ in range(concurrency)
+            ])
+            print_report(concurrency, time.perf_counter() - started, stats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ramp concurrent users against the RoleFlow API and report latency percentiles.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--hr-data", default="data/hr/hr_data.csv")
+    parser.add_argument("--users", type=int, default=50, help="Number of distinct users to log in as")
+    parser.add_argument("--stages", type=lambda v: [int(x) for x in v.split(",")], default=[1, 2, 4, 8, 16, 32],
+                        help="Comma-separated concurrency levels to ramp through")
+    parser.add_argument("--stage-seconds", type=float, default=30)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max random pause between a worker's requests")
+    parser.add_argument("--queries", help="Optional file with one query per line")
+    parser.add_argument("--unique-queries", action="store_true", help="Make every query distinct")
+    parser.add_argument("--conversational", action="store_true",
+                        help="Keep each user's conversation history, so queries after the first are follow-ups "
+                             "(default: clear it before every query to measure the standalone path)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
@@ -1,13 +1,30 @@
 import os
+import time
 import logging
-from fastapi import FastAPI, HTTPException, Depends, Security
+import threading
+from functools import partial
+from contextlib import ExitStack
+from fastapi import FastAPI, HTTPException, Depends, Security, BackgroundTasks, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict
-from auth import verify_user, decode_jwt_token, create_jwt_token
+from typing import List, Dict, Optional, Tuple
+from auth import verify_user, decode_jwt_token, create_jwt_token, refresh_user_scope, is_admin, policy_table, HR_DATA_PATH
 from vector_store import VectorStoreManager
-from chat import handle_consolidated_query_with_content_filtering
+from chat import (
+    handle_consolidated_query_with_content_filtering, summarize_conversation, build_timeout_answer,
+    REQUEST_DEADLINE_SECONDS, STORE_LOAD_BUDGET_SECONDS
+)
+from memory import ConversationMemory
+from admission import AdmissionController, SingleFlight, normalize_query
+from timing import ProfilerBusy, StageTimer, profile_call, read_profile_summary
+from jobs import ReindexJobManager
+from deadline import Deadline
+from query_log import QueryLog, top_queries
+from store_cache import RetrievalCache
+from profiles import profile_key
 from dotenv import load_dotenv
 
 # Configure logging
@@ -31,6 +48,66 @@ app.add_middleware(
 # Initialize VectorStoreManager
 vectorstore_manager = VectorStoreManager()
 
+# Server-side conversation sessions keyed by JWT subject
+conversation_memory = ConversationMemory(
+    max_history_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "800")),
+    max_recent_turns=int(os.getenv("HISTORY_RECENT_TURNS", "4"))
+)
+
+def forget_rescoped_conversations(employee_ids: List[str]):
+    """A user whose access changed mustn't keep a history built from their old folders."""
+    for employee_id in employee_ids:
+        conversation_memory.clear(str(employee_id))
+    logger.info(f"Cleared conversations of {len(employee_ids)} users whose access changed")
+
+policy_table.on_change(forget_rescoped_conversations)
+
+# Reindex jobs run in a separate process pool and are swapped in on completion;
+# popular questions touching the rebuilt department are then answered ahead of time
+reindex_jobs = ReindexJobManager(
+    vectorstore_manager,
+    max_workers=int(os.getenv("REINDEX_WORKERS", "1")),
+    on_swap=lambda department: schedule_prewarm([department])
+)
+
+# Opt-in query log (QUERY_LOG_PATH) and the answers precomputed from it
+query_log = QueryLog.from_env()
+answer_cache = RetrievalCache(max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "512")))
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "20"))
+PREWARM_MIN_COUNT = int(os.getenv("PREWARM_MIN_COUNT", "3"))
+PREWARM_SINCE_HOURS = float(os.getenv("PREWARM_SINCE_HOURS", "168"))
+
+# Per-user admission control and coalescing of identical in-flight queries
+admission_controller = AdmissionController(
+    rate=float(os.getenv("USER_RATE_PER_SEC", "0.5")),
+    burst=int(os.getenv("USER_RATE_BURST", "5")),
+    max_queue=int(os.getenv("USER_QUEUE_SIZE", "3")),
+    max_wait=float(os.getenv("USER_QUEUE_MAX_WAIT", "10"))
+)
+query_coalescer = SingleFlight()
+
+# Users allowed to request a per-request profile with the X-Profile header
+PROFILING_USER_IDS = {i.strip() for i in os.getenv("PROFILING_USER_IDS", "").split(",") if i.strip()}
+
+@app.on_event("startup")
+async def restore_index_snapshots():
+    """Load matching index snapshots so new replicas skip re-embedding the corpus."""
+    snapshot_dir = os.getenv("SNAPSHOT_DIR")
+    if snapshot_dir:
+        restored = vectorstore_manager.restore_snapshots(snapshot_dir)
+        logger.info(f"Restored index snapshots for: {restored}")
+    if query_log is not None and os.getenv("PREWARM_ON_STARTUP", "true").lower() == "true":
+        schedule_prewarm()
+
+@app.on_event("shutdown")
+async def stop_reindex_workers():
+    reindex_jobs.shutdown()
+    policy_table.close()
+    if query_log is not None:
+        query_log.close()
+    if vectorstore_manager.shards is not None:
+        vectorstore_manager.shards.close()
+
 # Initialize security
 security = HTTPBearer()
 
@@ -50,21 +127,45 @@ class QueryResponse(BaseModel):
 class ConsolidatedQueryResponse(BaseModel):
     response: str
     sources: List[str]
+    partial: bool = False
 
 class LoginResponse(BaseModel):
     token: str
     user_data: Dict
 
+class ReindexRequest(BaseModel):
+    departments: List[str]
+
+class PrewarmRequest(BaseModel):
+    departments: Optional[List[str]] = None
+
 # Dependency for JWT validation
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Security(security)):
     try:
         token = credentials.credentials
-        return decode_jwt_token(token)
+        timer = StageTimer()
+        request.state.timer = timer
+        with timer.stage("decode"):
+            payload = decode_jwt_token(token)
+            # Folders come from the current access policy, not the ones frozen into the token
+            current_user = refresh_user_scope(payload)
+        if current_user is None:
+            raise HTTPException(status_code=401, detail="User no longer active")
+        return current_user
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if not is_admin(current_user.get("employee_id")):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+def get_session_id(current_user: dict) -> str:
+    """Conversation sessions are keyed by the JWT subject (employee ID for older tokens)."""
+    return str(current_user.get("sub") or current_user["employee_id"])
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -97,15 +198,17 @@ async def get_available_departments():
         raise HTTPException(status_code=500, detail="Failed to fetch departments")
 
 @app.post("/login", response_model=LoginResponse)
-async def login(login_data: LoginRequest):
+async def login(login_data: LoginRequest, background_tasks: BackgroundTasks):
     """
     Authenticate user and return JWT token with user data.
+    The user's department stores are warmed up in the background after the response.
     """
     try:
-        user_data = verify_user("data/hr/hr_data.csv", login_data.full_name, login_data.department)
+        user_data = verify_user(HR_DATA_PATH, login_data.full_name, login_data.department)
         if not user_data:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         token = create_jwt_token(user_data)
+        background_tasks.add_task(vectorstore_manager.warm_up, user_data["accessible_folders"])
         logger.info(f"User {user_data['full_name']} logged in successfully")
         return {"token": token, "user_data": user_data}
     except Exception as e:
@@ -123,39 +226,264 @@ async def get_departments(current_user: dict = Depends(get_current_user)):
         logger.error(f"Error fetching departments: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch departments")
 
-@app.post("/query", response_model=ConsolidatedQueryResponse)
-async def query(query_data: QueryRequest, current_user: dict = Depends(get_current_user)):
+def is_profiling_allowed(current_user: dict) -> bool:
+    return str(current_user.get("employee_id")) in PROFILING_USER_IDS
+
+def get_request_deadline(request: Request) -> Tuple[Deadline, bool]:
     """
-    Handle user query and return consolidated response from all accessible departments.
+    The server's deadline, shortened if the client sends a tighter X-Request-Timeout (seconds).
+    Also returns whether the client shortened it.
     """
+    seconds = REQUEST_DEADLINE_SECONDS
     try:
-        accessible_departments = current_user["accessible_folders"]
-        
-        # Get all vectorstores for accessible departments
-        vectorstores = {}
-        for dept in accessible_departments:
-            vectorstore = vectorstore_manager.get_department_vectorstore(dept)
-            if vectorstore:
-                vectorstores[dept] = vectorstore
+        seconds = min(seconds, float(request.headers.get("X-Request-Timeout", seconds)))
+    except ValueError:
+        pass
+    return Deadline(max(0.0, seconds)), seconds < REQUEST_DEADLINE_SECONDS
+
+def answer_query(query_text: str, accessible_departments: List[str], history: str, timer: Optional[StageTimer] = None, deadline: Optional[Deadline] = None) -> Dict:
+    """
+    Blocking retrieval + generation for one query; runs in the threadpool.
+    """
+    timer = timer or StageTimer()
+    
+    profile_index = vectorstore_manager.get_profile_index(accessible_departments)
+    # Stores not loaded within the store-load budget are left out and keep loading in the background
+    load_deadline = deadline.stage(STORE_LOAD_BUDGET_SECONDS) if deadline is not None else None
+    with ExitStack() as held:
+        # Load the stores behind the user's access profile and hold them until the answer is
+        # done, so loading one can't evict another
+        with timer.stage("store_load"):
+            vectorstores = held.enter_context(profile_index.held_vectorstores(load_deadline))
         
-        if not vectorstores:
+        if not vectorstores and not profile_index.remote_departments:
+            if load_deadline is not None and load_deadline.expired():
+                logger.warning("No store loaded within the store-load budget")
+                return build_timeout_answer()
             logger.warning(f"No vectorstores found for departments: {accessible_departments}")
             raise HTTPException(status_code=404, detail="No accessible data found")
+        
+        if deadline is not None and deadline.expired():
+            logger.warning("Deadline reached while loading stores")
+            return build_timeout_answer()
 
-        result = handle_consolidated_query_with_content_filtering(
-            vectorstores, 
-            query_data.query, 
+        return handle_consolidated_query_with_content_filtering(
+            profile_index, 
+            query_text, 
             accessible_departments, 
-            os.getenv("OPENROUTER_API_KEY")
+            os.getenv("OPENROUTER_API_KEY"),
+            history=history,
+            timer=timer,
+            deadline=deadline
         )
+
+def answer_cache_key(normalized_query: str, accessible_departments: List[str]) -> tuple:
+    """
+    Precomputed answers are only valid for the index generations they were built from.
+    Stats each department's build stamp, so call it from a worker thread.
+    """
+    scope = profile_key(accessible_departments)
+    generations = tuple(vectorstore_manager.get_generation(dept) for dept in scope)
+    return ("answer", scope, generations, normalized_query)
+
+def prewarm_answers(departments: Optional[List[str]] = None) -> int:
+    """
+    Answer the most frequent logged questions of every access scope (touching `departments`,
+    if given) into the answer cache. Returns the number of answers computed.
+    """
+    if query_log is None:
+        return 0
+    changed = {dept.lower() for dept in departments} if departments else None
+    computed = 0
+    popular = top_queries(query_log.path, PREWARM_TOP_N, PREWARM_MIN_COUNT, PREWARM_SINCE_HOURS)
+    for scope, queries in popular.items():
+        if changed is not None and not changed & set(scope):
+            continue
+        if not queries:
+            continue
+        for normalized, _ in queries:
+            key = answer_cache_key(normalized, list(scope))
+            if answer_cache.get(key) is not None:
+                continue
+            try:
+                result = answer_query(normalized, list(scope), "")
+            except Exception as e:
+                logger.warning(f"Prewarming '{normalized}' for {scope} failed: {e}")
+                continue
+            if not result.get("partial"):
+                # Keyed by the generations from before answering, so a concurrent reindex can't leave it stale
+                answer_cache.put(key, result)
+                computed += 1
+    logger.info(f"Prewarmed {computed} answers")
+    return computed
+
+def schedule_prewarm(departments: Optional[List[str]] = None):
+    if query_log is not None:
+        threading.Thread(target=prewarm_answers, args=(departments,), name="prewarm", daemon=True).start()
+
+@app.post("/query", response_model=ConsolidatedQueryResponse)
+async def query(query_data: QueryRequest, request: Request, response: Response, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+    """
+    Handle user query and return consolidated response from all accessible departments.
+    Stage timings are returned in a Server-Timing header; privileged users can send
+    X-Profile: 1 to profile this request (the profile id comes back in X-Profile-Id).
+    The request runs under a deadline; when it expires before the LLM answers, the top
+    retrieved passages are returned with partial=true. Questions without history are
+    served from precomputed answers when available.
+    """
+    timer = request.state.timer
+    deadline, shortened_deadline = get_request_deadline(request)
+    try:
+        accessible_departments = current_user["accessible_folders"]
+        session_id = get_session_id(current_user)
+        history = await run_in_threadpool(conversation_memory.get_history, session_id)
+        normalized = normalize_query(query_data.query)
+        
+        if not history:
+            # Generations come from build stamps on disk, so the key is computed off the event loop
+            cache_key = await run_in_threadpool(answer_cache_key, normalized, accessible_departments)
+            cached = answer_cache.get(cache_key)
+            if cached is not None:
+                response.headers["Server-Timing"] = timer.header_value()
+                background_tasks.add_task(
+                    conversation_memory.add_turn,
+                    session_id,
+                    query_data.query,
+                    cached["response"],
+                    partial(summarize_conversation, openrouter_api_key=os.getenv("OPENROUTER_API_KEY"))
+                )
+                log_query(normalized, accessible_departments, timer, str(current_user["employee_id"]), cached=True)
+                return {"response": cached["response"], "sources": cached["sources"]}
+        
+        with timer.stage("admission"):
+            await admission_controller.acquire(session_id)
+        
+        if request.headers.get("X-Profile") == "1" and is_profiling_allowed(current_user):
+            # Profiled requests run alone so the profile covers exactly this request
+            try:
+                result, profile_id = await run_in_threadpool(
+                    profile_call, answer_query, query_data.query, accessible_departments, history, timer, deadline
+                )
+            except ProfilerBusy:
+                raise HTTPException(status_code=409, detail="Another request is being profiled; retry shortly")
+            response.headers["X-Profile-Id"] = profile_id
+        else:
+            ran_here = []
+            async def run_answer():
+                ran_here.append(True)
+                work_timer = StageTimer()
+                work_result = await run_in_threadpool(answer_query, query_data.query, accessible_departments, history, work_timer, deadline)
+                return work_result, work_timer
+            
+            # Identical questions over the same access scope and history share one LLM call;
+            # a client's tighter deadline would cut the shared call short for everyone, so those run alone
+            started = time.perf_counter()
+            if shortened_deadline:
+                result, work_timer = await run_answer()
+            else:
+                coalesce_key = (normalized, current_user["scope_id"], history)
+                result, work_timer = await query_coalescer.run(coalesce_key, run_answer)
+            if ran_here:
+                timer.merge(work_timer)
+            else:
+                # Waiters report their wait, not the work another request did
+                timer.add("coalesced", time.perf_counter() - started)
+        
+        response.headers["Server-Timing"] = timer.header_value()
+        
+        # Summarizing older turns happens after the response is sent; partial answers aren't remembered
+        if not result.get("partial"):
+            background_tasks.add_task(
+                conversation_memory.add_turn,
+                session_id,
+                query_data.query,
+                result["response"],
+                partial(summarize_conversation, openrouter_api_key=os.getenv("OPENROUTER_API_KEY"))
+            )
+        
+        if not history:
+            # Follow-ups depend on their conversation, so only standalone questions are logged
+            log_query(normalized, accessible_departments, timer, str(current_user["employee_id"]), partial=bool(result.get("partial")))
         
         logger.info(f"Consolidated query processed for {current_user['full_name']}")
         
         return {
             "response": result["response"],
-            "sources": result["sources"]
+            "sources": result["sources"],
+            "partial": result.get("partial", False)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Query error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+
+def log_query(normalized_query: str, accessible_departments: List[str], timer: StageTimer, asker: str, **flags):
+    if query_log is not None:
+        query_log.log(normalized_query, profile_key(accessible_departments), dict(timer.stages), asker, **flags)
+
+@app.delete("/conversation")
+async def clear_conversation(current_user: dict = Depends(get_current_user)):
+    """
+    Clear the server-side conversation history for the current user.
+    """
+    conversation_memory.clear(get_session_id(current_user))
+    return {"status": "cleared"}
+
+@app.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Return the cumulative-time summary of a stored request profile.
+    """
+    if not is_profiling_allowed(current_user):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+    summary = read_profile_summary(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+@app.post("/admin/reindex", status_code=202)
+async def enqueue_reindex(reindex_data: ReindexRequest, admin_user: dict = Depends(get_admin_user)):
+    """
+    Enqueue background reindex jobs for the given departments.
+    """
+    # Checked first: an API node needn't have local data for departments its shards own
+    remote = [dept for dept in reindex_data.departments if vectorstore_manager.is_remote(dept)]
+    if remote:
+        raise HTTPException(status_code=400, detail=f"Departments served by index shards must be reindexed on their shard: {remote}")
+    available = set(vectorstore_manager.get_available_departments())
+    unknown = [dept for dept in reindex_data.departments if dept.lower() not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown departments: {unknown}")
+    jobs = [reindex_jobs.submit(dept) for dept in reindex_data.departments]
+    logger.info(f"Reindex requested by {admin_user['full_name']} for {reindex_data.departments}")
+    return {"jobs": [job.to_dict() for job in jobs]}
+
+@app.get("/admin/jobs")
+async def list_reindex_jobs(admin_user: dict = Depends(get_admin_user)):
+    """
+    List recent reindex jobs with their progress and timing.
+    """
+    return {"jobs": [job.to_dict() for job in reindex_jobs.list()]}
+
+@app.get("/admin/jobs/{job_id}")
+async def get_reindex_job(job_id: str, admin_user: dict = Depends(get_admin_user)):
+    """
+    Get progress and timing of one reindex job.
+    """
+    job = reindex_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/admin/prewarm", status_code=202)
+async def enqueue_prewarm(prewarm_data: PrewarmRequest, admin_user: dict = Depends(get_admin_user)):
+    """
+    Precompute answers to the most frequent logged questions (optionally only for scopes
+    touching the given departments) in the background.
+    """
+    if query_log is None:
+        raise HTTPException(status_code=400, detail="Query log is not enabled (QUERY_LOG_PATH)")
+    schedule_prewarm(prewarm_data.departments)
+    return {"status": "scheduled", "departments": prewarm_data.departments}
@@ -0,0 +1,145 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for history budgeting."""
+    return (len(text) + 3) // 4
+
+
+def format_turns(turns: List[Turn]) -> str:
+    return "\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+class ConversationSession:
+    """Rolling summary of older turns plus the most recent turns verbatim."""
+
+    def __init__(self):
+        self.summary = ""
+        self.turns: List[Turn] = []
+        self.last_active = time.time()
+        self.lock = threading.Lock()
+        # Serializes summary updates; held while the (slow) summarizer runs, unlike `lock`
+        self.summary_lock = threading.Lock()
+
+
+class ConversationMemory:
+    def __init__(self, max_history_tokens: int = 800, max_recent_turns: int = 4,
+                 max_sessions: int = 1000, session_ttl: int = 24 * 3600):
+        """
+        Server-side conversation sessions keyed by the JWT subject.
+        The history injected into prompts never exceeds max_history_tokens.
+        """
+        self.max_history_tokens = max_history_tokens
+        self.max_recent_turns = max_recent_turns
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        # The summary may use at most half of the history budget
+        self.max_summary_chars = (max_history_tokens // 2) * 4
+        self.sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_session(self, session_id: str, create: bool = True) -> Optional[ConversationSession]:
+        with self._lock:
+            now = time.time()
+            # Drop idle sessions from the least recently used end
+            while self.sessions:
+                oldest_id, oldest = next(iter(self.sessions.items()))
+                if now - oldest.last_active <= self.session_ttl and len(self.sessions) <= self.max_sessions:
+                    break
+                del self.sessions[oldest_id]
+
+            session = self.sessions.get(session_id)
+            if session is None and create:
+                session = ConversationSession()
+                self.sessions[session_id] = session
+            if session is not None:
+                session.last_active = now
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def get_history(self, session_id: str) -> str:
+        """
+        Render the summary and the newest turns that fit within the token cap.
+        """
+        session = self._get_session(session_id, create=False)
+        if session is None:
+            return ""
+
+        with session.lock:
+            summary = session.summary
+            turns = list(session.turns)
+
+        budget = self.max_history_tokens
+        parts = []
+        if summary:
+            summary_text = f"Summary of earlier conversation: {self._bound_summary(summary)}"
+            budget -= estimate_tokens(summary_text)
+            parts.append(summary_text)
+
+        recent = []
+        for turn in reversed(turns):
+            turn_text = format_turns([turn])
+            cost = estimate_tokens(turn_text)
+            if cost > budget:
+                break
+            recent.insert(0, turn_text)
+            budget -= cost
+
+        return "\n".join(parts + recent)
+
+    def _bound_summary(self, summary: str) -> str:
+        """Keep the newest part of an over-long summary."""
+        summary = summary.strip()
+        if len(summary) > self.max_summary_chars:
+            summary = summary[-self.max_summary_chars:]
+        return summary
+
+    def add_turn(self, session_id: str, question: str, answer: str,
+                 summarize: Optional[Callable[[str, List[Turn]], str]] = None):
+        """
+        Record a turn and fold the oldest turns into the rolling summary once the
+        verbatim history grows past its limits. The summarizer runs without holding the
+        session lock, so reading the history never waits for it.
+        """
+        session = self._get_session(session_id)
+        with session.lock:
+            session.turns.append((question, answer))
+
+            overflow = []
+            while len(session.turns) > 1 and (
+                len(session.turns) > self.max_recent_turns
+                or estimate_tokens(format_turns(session.turns)) > self.max_history_tokens
+            ):
+                overflow.append(session.turns.pop(0))
+
+        if not overflow:
+            return
+
+        with session.summary_lock:
+            with session.lock:
+                summary = session.summary
+
+            if summarize is None:
+                updated = summary + "\n" + format_turns(overflow)
+            else:
+                try:
+                    updated = summarize(summary, overflow)
+                except Exception as e:
+                    logger.warning(f"Conversation summary failed for {session_id}: {e}")
+                    updated = summary + "\n" + format_turns(overflow)
+
+            with session.lock:
+                session.summary = self._bound_summary(updated)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self.sessions.pop(session_id, None)
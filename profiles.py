@@ -0,0 +1,201 @@
+import heapq
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain_core.documents import Document
+from admission import normalize_query
+from chunk_registry import ChunkRecord, ChunkRegistry
+from deadline import Deadline
+from timing import StageTimer, running_inline
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Shared pool for fanning a profile search out over its departments
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="profile-search")
+
+
+def profile_key(departments: Iterable[str]) -> Tuple[str, ...]:
+    """Canonical identity of an access scope: its sorted, lower-cased departments."""
+    return tuple(sorted({dept.lower() for dept in departments}))
+
+
+def distance_to_similarity(distance: float) -> float:
+    """
+    Chroma's default space is squared L2; for unit-normalized embeddings that is 2 - 2*cos.
+    """
+    return 1.0 - distance / 2.0
+
+
+class AccessProfileIndex:
+    def __init__(self, manager, departments: Iterable[str]):
+        """
+        Virtual index over exactly one access profile (e.g. finance + general). It searches
+        each member department and merges the results into one correctly ranked global
+        top-k. Stores are resolved (and held) through the manager on every search, so evicted
+        or reindexed departments are picked up automatically. Per-department results are
+        served from the manager's generation-versioned retrieval cache when possible.
+        Departments owned by remote index servers are searched there, one request per shard.
+        """
+        self.manager = manager
+        self.key = profile_key(departments)
+
+    @property
+    def embeddings(self):
+        return self.manager.embeddings
+
+    @property
+    def registry(self) -> ChunkRegistry:
+        return self.manager.chunk_registry
+
+    @property
+    def remote_departments(self) -> List[str]:
+        return [dept for dept in self.key if self.manager.is_remote(dept)]
+
+    @contextmanager
+    def held_vectorstores(self, deadline: Optional[Deadline] = None) -> Iterator[Dict]:
+        """The profile's local stores, loaded and held for the block (see VectorStoreManager.held_vectorstores)."""
+        local = [dept for dept in self.key if not self.manager.is_remote(dept)]
+        with self.manager.held_vectorstores(local, deadline) as stores:
+            yield stores
+
+    def _search_department(self, dept: str, vectorstore, query_vector: List[float], k: int,
+                           timer: StageTimer) -> List[Tuple[ChunkRecord, float]]:
+        with timer.stage(f"search-{dept}"):
+            results = vectorstore.similarity_search_by_vector_with_relevance_scores(query_vector, k=k)
+        # Filter documents by department (interned ids, no per-chunk string handling)
+        registry = self.registry
+        dept_id = registry.department_id(dept)
+        records = ((registry.register(doc), distance) for doc, distance in results)
+        return [
+            (record, distance_to_similarity(distance))
+            for record, distance in records
+            if record.department_id == dept_id
+        ]
+
+    def _search_shard(self, shard, departments: List[str], query_vector: List[float], k: int,
+                      timer: StageTimer) -> Dict[str, List[Tuple[ChunkRecord, float]]]:
+        """Per-department results from one remote shard; an unreachable shard contributes nothing."""
+        try:
+            with timer.stage(f"shard-{'+'.join(departments)}"):
+                response = shard.search(query_vector, departments, k, self.manager.embeddings_id)
+        except Exception as e:
+            logger.warning(f"Shard {shard.url} failed for {departments}: {e}")
+            return {}
+
+        registry = self.registry
+        results = {}
+        for dept, payload in response.items():
+            self.manager.shards.observe(dept, payload["generation"])
+            dept_id = registry.department_id(dept)
+            records = (
+                (registry.register(Document(page_content=hit["text"], metadata=hit["metadata"]), store_id=hit["id"]), hit["score"])
+                for hit in payload["results"]
+            )
+            results[dept] = [(record, score) for record, score in records if record.department_id == dept_id]
+        return results
+
+    def _result_within(self, future, deadline: Optional[Deadline], what: str):
+        """The future's result, or None if it isn't ready before the deadline."""
+        try:
+            return future.result(timeout=deadline.remaining() if deadline is not None else None)
+        except FutureTimeout:
+            logger.warning(f"Search of {what} missed the retrieval deadline; skipping it")
+            return None
+
+    def search(self, query: str, k: int, timer: Optional[StageTimer] = None,
+               deadline: Optional[Deadline] = None) -> List[Tuple[ChunkRecord, float]]:
+        """
+        Global top-k over the profile. The global top-k is always contained in the union of
+        each department's top-k, so merging per-department results is exact. If a router is
+        configured, only the departments it selects are searched. The query is only
+        embedded if routing or some department search misses the retrieval cache.
+        With a deadline, departments and shards that haven't answered by then are left out
+        (and not cached), as are stores still loading then, so the result may be partial.
+        The stores are held for the whole search, so none is evicted or stopped under it.
+        """
+        timer = timer or StageTimer()
+        with self.held_vectorstores(deadline) as stores:
+            return self._search_stores(stores, query, k, timer, deadline)
+
+    def _search_stores(self, stores: Dict, query: str, k: int, timer: StageTimer,
+                       deadline: Optional[Deadline]) -> List[Tuple[ChunkRecord, float]]:
+        remote = self.remote_departments
+        if not stores and not remote:
+            return []
+
+        normalized = normalize_query(query)
+        cache = self.manager.retrieval_cache
+        query_vector = None
+
+        router = self.manager.router
+        candidates = list(stores) + remote
+        if router is not None and len(candidates) > 1:
+            generations = tuple(self.manager.get_generation(dept) for dept in candidates)
+            route_key = ("route", tuple(candidates), generations, normalized)
+            routed = cache.get(route_key)
+            if routed is None:
+                with timer.stage("embed"):
+                    query_vector = self.manager.embed_query(query)
+                with timer.stage("route"):
+                    routed = router.route(query_vector, candidates)
+                cache.put(route_key, routed)
+            stores = {dept: stores[dept] for dept in routed if dept in stores}
+            remote = [dept for dept in remote if dept in routed]
+
+        per_department = []
+        misses = {}
+        remote_misses = {}
+        for dept in list(stores) + remote:
+            cache_key = (dept, self.manager.get_generation(dept), normalized, k)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                per_department.append(cached)
+            elif dept in stores:
+                misses[cache_key] = (dept, stores[dept])
+            else:
+                remote_misses[dept] = cache_key
+
+        if misses or remote_misses:
+            if query_vector is None:
+                with timer.stage("embed"):
+                    query_vector = self.manager.embed_query(query)
+
+            shard_plan = self.manager.shards.plan(list(remote_misses)) if remote_misses else {}
+            if running_inline():
+                # Profiled request: search one after another on this thread
+                results = {
+                    cache_key: self._search_department(dept, vectorstore, query_vector, k, timer)
+                    for cache_key, (dept, vectorstore) in misses.items()
+                }
+                for shard, depts in shard_plan.items():
+                    for dept, dept_results in self._search_shard(shard, depts, query_vector, k, timer).items():
+                        results[(dept, self.manager.get_generation(dept), normalized, k)] = dept_results
+            elif len(misses) == 1 and not shard_plan and deadline is None:
+                (cache_key, (dept, vectorstore)), = misses.items()
+                results = {cache_key: self._search_department(dept, vectorstore, query_vector, k, timer)}
+            else:
+                futures = {
+                    cache_key: _search_pool.submit(self._search_department, dept, vectorstore, query_vector, k, timer)
+                    for cache_key, (dept, vectorstore) in misses.items()
+                }
+                shard_futures = [
+                    _search_pool.submit(self._search_shard, shard, depts, query_vector, k, timer)
+                    for shard, depts in shard_plan.items()
+                ]
+                results = {}
+                for cache_key, future in futures.items():
+                    dept_results = self._result_within(future, deadline, cache_key[0])
+                    if dept_results is not None:
+                        results[cache_key] = dept_results
+                for future in shard_futures:
+                    for dept, dept_results in (self._result_within(future, deadline, "shard") or {}).items():
+                        # Key by the generation the shard just reported
+                        results[(dept, self.manager.get_generation(dept), normalized, k)] = dept_results
+
+            for cache_key, dept_results in results.items():
+                cache.put(cache_key, dept_results)
+                per_department.append(dept_results)
+
+        return heapq.nlargest(k, (item for results in per_department for item in results), key=lambda item: item[1])
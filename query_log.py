@@ -0,0 +1,153 @@
+import os
+import hmac
+import json
+import time
+import queue
+import hashlib
+import logging
+import argparse
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class QueryLog:
+    def __init__(self, path: str, max_pending: int = 10000, min_users: int = 3,
+                 salt: Optional[str] = None, max_tracked: int = 100000):
+        """
+        Opt-in, append-only JSON-lines log of answered queries. Records hold the access
+        scope, stage timings and an hour-granular timestamp; never a user id, session,
+        history or answer. A query's text is only written once at least min_users distinct
+        users have asked it within the same scope (k-anonymity); until then the record
+        carries a salted hash of it instead. Askers are counted in memory by salted hash
+        (at most max_tracked queries, oldest forgotten first). Writes happen on a
+        background thread, and records are dropped rather than blocking a request when
+        the writer falls behind.
+        """
+        self.path = path
+        self.dropped = 0
+        self.min_users = min_users
+        # Without a configured salt the hashes only match within one process
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self._max_tracked = max_tracked
+        self._askers: "OrderedDict[str, set]" = OrderedDict()
+        self._released: "OrderedDict[str, None]" = OrderedDict()
+        self._askers_lock = threading.Lock()
+        self._pending: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=max_pending)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, name="query-log", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["QueryLog"]:
+        path = os.getenv("QUERY_LOG_PATH")
+        if not path:
+            return None
+        return cls(
+            path,
+            min_users=int(os.getenv("QUERY_LOG_MIN_USERS", "3")),
+            salt=os.getenv("QUERY_LOG_SALT") or None,
+        )
+
+    def _hash(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def _is_anonymous(self, query_hash: str, asker: str) -> bool:
+        """Count the asker; True once enough distinct users have asked this query."""
+        with self._askers_lock:
+            if query_hash in self._released:
+                self._released.move_to_end(query_hash)
+                return True
+            askers = self._askers.pop(query_hash, set())
+            askers.add(self._hash(asker))
+            if len(askers) >= self.min_users:
+                self._released[query_hash] = None
+                if len(self._released) > self._max_tracked:
+                    self._released.popitem(last=False)
+                return True
+            self._askers[query_hash] = askers
+            if len(self._askers) > self._max_tracked:
+                self._askers.popitem(last=False)
+            return False
+
+    def log(self, normalized_query: str, scope: Tuple[str, ...], stages: Dict[str, float], asker: str, **flags):
+        query_hash = self._hash("\x00".join(scope) + "\x00" + normalized_query)
+        record = {
+            "hour": int(time.time() // 3600 * 3600),
+            "scope": list(scope),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in stages.items()},
+            **flags,
+        }
+        if self._is_anonymous(query_hash, asker):
+            record["query"] = normalized_query
+        else:
+            record["query_hash"] = query_hash
+        try:
+            self._pending.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._pending.get()
+                if record is None:
+                    break
+                f.write(json.dumps(record) + "\n")
+                # Flush once the burst is written
+                if self._pending.empty():
+                    f.flush()
+
+    def close(self):
+        self._pending.put(None)
+        self._writer.join(timeout=5)
+
+
+def read_query_log(path: str) -> Iterator[Dict]:
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A partially written last line
+                continue
+
+
+def top_queries(path: str, top_n: int = 20, min_count: int = 2,
+                since_hours: Optional[float] = None) -> Dict[Tuple[str, ...], List[Tuple[str, int]]]:
+    """
+    Most frequent queries per access scope. Queries seen fewer than min_count times are
+    never returned, so one-off questions don't end up precomputed. Only records whose text
+    was logged (enough distinct askers) are counted.
+    """
+    cutoff = time.time() - since_hours * 3600 if since_hours else None
+    counts: Dict[Tuple[str, ...], Counter] = defaultdict(Counter)
+    for record in read_query_log(path):
+        if "query" not in record or (cutoff is not None and record.get("hour", 0) < cutoff - 3600):
+            continue
+        counts[tuple(record["scope"])][record["query"]] += 1
+    return {
+        scope: [(query, count) for query, count in counter.most_common(top_n) if count >= min_count]
+        for scope, counter in counts.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the most frequent logged queries per access scope")
+    parser.add_argument("--log", default=os.getenv("QUERY_LOG_PATH", "./query_log.jsonl"))
+    parser.add_argument("--top-n", type=int, default=20)
+    parser.add_argument("--min-count", type=int, default=2)
+    parser.add_argument("--since-hours", type=float, default=None)
+    args = parser.parse_args()
+
+    for scope, queries in top_queries(args.log, args.top_n, args.min_count, args.since_hours).items():
+        if not queries:
+            continue
+        print(f"[{', '.join(scope)}]")
+        for query, count in queries:
+            print(f"  {count:6d}  {query}")
@@ -0,0 +1,169 @@
+import os
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import pandas as pd
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _folders(values) -> Tuple[str, ...]:
+    """Lower-cased folders in declared order, without duplicates."""
+    return tuple(dict.fromkeys(str(v).strip().lower() for v in values if str(v).strip()))
+
+
+class AccessPolicy:
+    def __init__(self, spec: Dict):
+        """
+        Declarative access policy, e.g. rbac_policy.json:
+          default      folders for anyone not matched below
+          groups       named employee-id lists with their folders; membership overrides everything
+                       else, and the first listed group an employee belongs to wins
+          departments  department -> folders
+          roles        role -> extra folders, added to the department's
+        """
+        self.default = _folders(spec.get("default", ["general"]))
+        self.groups = {
+            name: ({str(i).strip() for i in group.get("employee_ids", [])}, _folders(group.get("folders", [])))
+            for name, group in spec.get("groups", {}).items()
+        }
+        self.departments = {dept.strip().lower(): _folders(folders) for dept, folders in spec.get("departments", {}).items()}
+        self.roles = {role.strip().lower(): _folders(folders) for role, folders in spec.get("roles", {}).items()}
+
+    @classmethod
+    def load(cls, path: str) -> "AccessPolicy":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def group_members(self, name: str) -> List[str]:
+        members, _ = self.groups.get(name, (set(), ()))
+        return sorted(members)
+
+    def is_member(self, name: str, employee_id: str) -> bool:
+        members, _ = self.groups.get(name, (set(), ()))
+        return str(employee_id).strip() in members
+
+    def resolve(self, department: str, role: str = "", employee_id: Optional[str] = None) -> Tuple[str, ...]:
+        """Folders for a single user; the same rules evaluate() applies to a whole table."""
+        for members, folders in self.groups.values():
+            if employee_id is not None and str(employee_id) in members:
+                return folders
+        base = self.departments.get(department.strip().lower(), self.default)
+        return _folders(base + self.roles.get(str(role).strip().lower(), ()))
+
+
+class PolicyTable:
+    def __init__(self, policy_path: str, hr_path: str, check_interval: float = 2.0):
+        """
+        Precomputed access scopes of every employee. The policy is evaluated once over the
+        whole HR table (per distinct department/role pair, then joined back), and each
+        distinct folder set gets a small, stable scope id. Lookups are O(1) per request and
+        never touch the disk: a background thread checks both files' mtimes every
+        check_interval seconds and rebuilds the table when either changes. Listeners added
+        with on_change() are called with the employee ids whose scope changed.
+        """
+        self.policy_path = policy_path
+        self.hr_path = hr_path
+        self.check_interval = check_interval
+        self.policy: Optional[AccessPolicy] = None
+        self.hr: Optional[pd.DataFrame] = None
+        self._scopes: List[Tuple[str, ...]] = []
+        self._scope_ids: Dict[Tuple[str, ...], int] = {}
+        self._user_scopes: Dict[str, int] = {}
+        self._mtimes: Tuple[float, float] = (0.0, 0.0)
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.reload()
+        self._watcher = threading.Thread(target=self._watch_loop, name="policy-watcher", daemon=True)
+        self._watcher.start()
+
+    def _mtime(self, path: str) -> float:
+        return os.path.getmtime(path) if os.path.exists(path) else 0.0
+
+    def scope_id(self, folders) -> int:
+        """Stable id of a folder set; ids are never reused across reloads."""
+        key = tuple(sorted(set(folders)))
+        scope_id = self._scope_ids.get(key)
+        if scope_id is None:
+            scope_id = len(self._scopes)
+            self._scopes.append(_folders(folders))
+            self._scope_ids[key] = scope_id
+        return scope_id
+
+    def scope_folders(self, scope_id: int) -> List[str]:
+        return list(self._scopes[scope_id])
+
+    def evaluate(self, policy: AccessPolicy, hr: pd.DataFrame) -> pd.Series:
+        """Scope id of every employee, indexed by employee_id."""
+        employees = pd.DataFrame({
+            "employee_id": hr["employee_id"].astype(str).str.strip(),
+            "department": hr["department"].astype(str).str.strip().str.lower(),
+            "role": hr["role"].astype(str).str.strip().str.lower() if "role" in hr else "",
+        })
+        pairs = employees[["department", "role"]].drop_duplicates()
+        pairs = pairs.assign(scope_id=[
+            self.scope_id(policy.resolve(department, role)) for department, role in zip(pairs["department"], pairs["role"])
+        ])
+        scopes = employees.merge(pairs, on=["department", "role"], how="left").set_index("employee_id")["scope_id"]
+        # Last assignment wins here, so apply groups in reverse to match resolve(): first group wins
+        for members, folders in reversed(list(policy.groups.values())):
+            in_group = scopes.index.isin(members)
+            if in_group.any():
+                scopes[in_group] = self.scope_id(folders)
+        return scopes
+
+    def reload(self) -> List[str]:
+        """Recompile from disk; returns the employee ids whose scope changed."""
+        with self._lock:
+            mtimes = (self._mtime(self.policy_path), self._mtime(self.hr_path))
+            policy = AccessPolicy.load(self.policy_path)
+            hr = pd.read_csv(self.hr_path)
+            scopes = self.evaluate(policy, hr)
+            user_scopes = {employee_id: int(scope_id) for employee_id, scope_id in scopes.items()}
+
+            changed = [
+                employee_id for employee_id in set(user_scopes) | set(self._user_scopes)
+                if user_scopes.get(employee_id) != self._user_scopes.get(employee_id)
+            ]
+            self.policy, self.hr, self._user_scopes, self._mtimes = policy, hr, user_scopes, mtimes
+        logger.info(f"Loaded access policy: {len(user_scopes)} employees, {len(set(user_scopes.values()))} scopes, {len(changed)} changed")
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(changed)
+                except Exception as e:
+                    logger.error(f"Access policy change listener failed: {e}")
+        return changed
+
+    def on_change(self, listener: Callable[[List[str]], None]):
+        """Call listener(employee_ids) after every reload that changes someone's scope."""
+        self._listeners.append(listener)
+
+    def reload_if_changed(self):
+        if (self._mtime(self.policy_path), self._mtime(self.hr_path)) != self._mtimes:
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the last good table
+                logger.error(f"Access policy reload failed: {e}")
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.check_interval):
+            self.reload_if_changed()
+
+    def close(self):
+        self._stop.set()
+
+    def is_member(self, group: str, employee_id: str) -> bool:
+        """Group membership under the current policy."""
+        return self.policy.is_member(group, employee_id)
+
+    def lookup(self, employee_id: str) -> Optional[Tuple[int, List[str]]]:
+        """(scope id, folders) of an employee, or None if they are not in the HR table."""
+        scope_id = self._user_scopes.get(str(employee_id).strip())
+        if scope_id is None:
+            return None
+        return scope_id, self.scope_folders(scope_id)
@@ -0,0 +1,117 @@
+import os
+import math
+import logging
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from chunk_registry import ChunkRecord
+from deadline import Deadline
+from profiles import AccessProfileIndex
+from timing import StageTimer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ScoredChunk = Tuple[ChunkRecord, float]
+
+
+class RetrievalConfig:
+    def __init__(self, fetch_k: int = 12, min_score: float = 0.25, relative_margin: float = 0.2,
+                 max_chunks: int = 6, confidence_target: float = 0.9,
+                 rerank_model: Optional[str] = None, rerank_top_n: int = 12, rerank_min_score: float = 0.1):
+        """
+        Settings for adaptive retrieval.
+        - fetch_k: candidates over-fetched from the user's access profile
+        - min_score / relative_margin: drop candidates below min_score or more than
+          relative_margin below the best candidate
+        - max_chunks / confidence_target: stop adding chunks once either is reached
+        - rerank_model: optional cross-encoder applied to the top rerank_top_n candidates;
+          candidates it scores below rerank_min_score are dropped
+        """
+        self.fetch_k = fetch_k
+        self.min_score = min_score
+        self.relative_margin = relative_margin
+        self.max_chunks = max_chunks
+        self.confidence_target = confidence_target
+        self.rerank_model = rerank_model
+        self.rerank_top_n = rerank_top_n
+        self.rerank_min_score = rerank_min_score
+
+    @classmethod
+    def from_env(cls) -> "RetrievalConfig":
+        return cls(
+            fetch_k=int(os.getenv("RETRIEVAL_FETCH_K", "12")),
+            min_score=float(os.getenv("RETRIEVAL_MIN_SCORE", "0.25")),
+            relative_margin=float(os.getenv("RETRIEVAL_RELATIVE_MARGIN", "0.2")),
+            max_chunks=int(os.getenv("RETRIEVAL_MAX_CHUNKS", "6")),
+            confidence_target=float(os.getenv("RETRIEVAL_CONFIDENCE_TARGET", "0.9")),
+            rerank_model=os.getenv("RERANK_MODEL") or None,
+            rerank_top_n=int(os.getenv("RERANK_TOP_N", "12")),
+            rerank_min_score=float(os.getenv("RERANK_MIN_SCORE", "0.1")),
+        )
+
+
+@lru_cache(maxsize=2)
+def get_cross_encoder(model_name: str):
+    """Load a (small, CPU-friendly) cross-encoder once per process."""
+    from sentence_transformers import CrossEncoder
+    logger.info(f"Loading cross-encoder {model_name}")
+    return CrossEncoder(model_name, device="cpu")
+
+
+def rerank(query: str, candidates: List[ScoredChunk], model_name: str) -> List[ScoredChunk]:
+    """
+    Rescore candidates with a cross-encoder; logits are mapped to probabilities.
+    """
+    if not candidates:
+        return candidates
+    model = get_cross_encoder(model_name)
+    logits = model.predict([(query, record.text) for record, _ in candidates])
+    rescored = [(record, 1.0 / (1.0 + math.exp(-float(logit)))) for (record, _), logit in zip(candidates, logits)]
+    return sorted(rescored, key=lambda item: item[1], reverse=True)
+
+
+def select_until_confident(candidates: List[ScoredChunk], config: RetrievalConfig) -> List[ScoredChunk]:
+    """
+    Take candidates in score order until the chance that at least one of them is
+    relevant, 1 - prod(1 - score), reaches the confidence target.
+    """
+    selected = []
+    miss_probability = 1.0
+    for record, score in candidates:
+        selected.append((record, score))
+        miss_probability *= 1.0 - min(max(score, 0.0), 0.99)
+        if len(selected) >= config.max_chunks or 1.0 - miss_probability >= config.confidence_target:
+            break
+    return selected
+
+
+def retrieve_documents(profile_index: AccessProfileIndex, query: str,
+                       config: Optional[RetrievalConfig] = None, timer: Optional[StageTimer] = None,
+                       deadline: Optional[Deadline] = None) -> List[ScoredChunk]:
+    """
+    Adaptive retrieval over the user's access profile: over-fetch a global top-k (the
+    query is embedded at most once), drop weak candidates, optionally rerank, and keep only as many chunks
+    as the confidence target needs. Returns (chunk record, score) pairs.
+    With a deadline, departments that miss it are left out and reranking is skipped once it has passed.
+    """
+    config = config or RetrievalConfig.from_env()
+    timer = timer or StageTimer()
+
+    # Sorted by similarity, best first
+    candidates = profile_index.search(query, k=config.fetch_k, timer=timer, deadline=deadline)
+    if not candidates:
+        return []
+
+    threshold = max(config.min_score, candidates[0][1] - config.relative_margin)
+    candidates = [(record, score) for record, score in candidates if score >= threshold]
+
+    if config.rerank_model and (deadline is None or not deadline.expired()):
+        with timer.stage("rerank"):
+            candidates = rerank(query, candidates[:config.rerank_top_n], config.rerank_model)
+        # Off-topic questions: nothing passes the floor, so no context rather than the least bad
+        candidates = [(record, score) for record, score in candidates if score >= config.rerank_min_score]
+        if not candidates:
+            logger.info("No candidate passed the rerank relevance floor")
+            return []
+
+    return select_until_confident(candidates, config)
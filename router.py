@@ -0,0 +1,138 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def cluster_centroids(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: a few unit-length centroids summarizing a department's chunks."""
+    vectors = _normalize_rows(vectors)
+    k = min(n_clusters, len(vectors))
+    rng = np.random.RandomState(seed)
+    centers = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centers.T, axis=1)
+        for j in range(k):
+            members = vectors[assignment == j]
+            if len(members):
+                centers[j] = members.mean(axis=0)
+        centers = _normalize_rows(centers)
+    return centers
+
+
+class DepartmentRouter:
+    def __init__(self, manager, margin: float = 0.1, min_confidence: float = 0.3,
+                 n_clusters: int = 4, max_sample: int = 5000):
+        """
+        Routes a query to the departments likely to answer it, using a few cluster-centroid
+        embeddings per department. A department is searched if its best centroid scores
+        within `margin` of the best department; if no department reaches `min_confidence`,
+        every department is searched.
+        """
+        self.manager = manager
+        self.margin = margin
+        self.min_confidence = min_confidence
+        self.n_clusters = n_clusters
+        self.max_sample = max_sample
+        self._centroids: Dict[str, Tuple[int, Optional[np.ndarray]]] = {}
+        # Per department, so computing one department's centroids (possibly behind an index
+        # build) never holds up routing over the others
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @classmethod
+    def from_env(cls, manager) -> Optional["DepartmentRouter"]:
+        if os.getenv("ROUTER_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            manager,
+            margin=float(os.getenv("ROUTER_MARGIN", "0.1")),
+            min_confidence=float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.3")),
+            n_clusters=int(os.getenv("ROUTER_CLUSTERS", "4")),
+        )
+
+    def _load_centroids(self, department: str) -> Optional[np.ndarray]:
+        if self.manager.is_remote(department):
+            # Computed by the owning shard; if it can't be reached the department stays unknown
+            try:
+                payload = self.manager.shards.owner(department).centroids([department])[department]
+            except Exception as e:
+                logger.warning(f"Could not fetch routing centroids for {department}: {e}")
+                return None
+            self.manager.shards.observe(department, payload["generation"])
+            if payload["centroids"] is None:
+                return None
+            return np.asarray(payload["centroids"], dtype=np.float32)
+
+        with self.manager.held_vectorstores([department]) as stores:
+            if department not in stores:
+                return None
+            data = stores[department].get(include=["embeddings"], limit=self.max_sample)
+        if data["embeddings"] is None or not len(data["embeddings"]):
+            return None
+        return cluster_centroids(np.asarray(data["embeddings"], dtype=np.float32), self.n_clusters)
+
+    def get_centroids(self, department: str) -> Optional[np.ndarray]:
+        """
+        Centroids for the department's current index generation, computed on first use
+        (fetched from the owning shard for remote departments).
+        """
+        generation = self.manager.get_generation(department)
+        cached = self._centroids.get(department)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        with self._locks_guard:
+            lock = self._locks.setdefault(department, threading.Lock())
+        with lock:
+            cached = self._centroids.get(department)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+
+            centroids = self._load_centroids(department)
+            if self.manager.is_remote(department):
+                # The shard reported the generation these centroids belong to
+                generation = self.manager.get_generation(department)
+            self._centroids[department] = (generation, centroids)
+            return centroids
+
+    def route(self, query_vector: List[float], departments: List[str]) -> List[str]:
+        """
+        Subset of `departments` worth searching for this query (never outside of it).
+        """
+        if len(departments) <= 1:
+            return list(departments)
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = {}
+        unknown = []
+        for department in departments:
+            centroids = self.get_centroids(department)
+            if centroids is None:
+                # Unknown content: don't risk skipping it
+                unknown.append(department)
+            else:
+                scores[department] = float(np.max(centroids @ query))
+
+        if not scores:
+            return list(departments)
+        best = max(scores.values())
+        if best < self.min_confidence:
+            return list(departments)
+
+        selected = [
+            department for department in departments
+            if department in unknown or scores[department] >= best - self.margin
+        ]
+        logger.debug(f"Routed query to {selected} (scores: {scores}, unknown: {unknown})")
+        return selected
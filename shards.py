@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+import httpx
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class RemoteShard:
+    def __init__(self, url: str, departments: List[str], timeout: float = 5.0, token: Optional[str] = None):
+        """Client for one index server (index_server.py) owning `departments`."""
+        self.url = url.rstrip("/")
+        self.departments = frozenset(dept.lower() for dept in departments)
+        headers = {"X-Shard-Token": token} if token else {}
+        self.client = httpx.Client(base_url=self.url, timeout=timeout, headers=headers)
+
+    def search(self, query_vector: List[float], departments: List[str], k: int,
+               embeddings_id: Optional[str] = None) -> Dict[str, Dict]:
+        """Per-department top-k: {department: {"generation": ..., "results": [{id, text, metadata, score}]}}."""
+        response = self.client.post("/search", json={
+            "query_vector": [float(x) for x in query_vector],
+            "departments": departments,
+            "k": k,
+            "embeddings_id": embeddings_id,
+        })
+        response.raise_for_status()
+        return response.json()["departments"]
+
+    def centroids(self, departments: List[str]) -> Dict[str, Dict]:
+        """Routing centroids per department: {department: {"generation": ..., "centroids": [[...]] or None}}."""
+        response = self.client.get("/centroids", params={"departments": departments})
+        response.raise_for_status()
+        return response.json()["departments"]
+
+    def generations(self) -> Dict[str, str]:
+        response = self.client.get("/generations")
+        response.raise_for_status()
+        return response.json()
+
+    def __repr__(self) -> str:
+        return f"RemoteShard({self.url}, {sorted(self.departments)})"
+
+
+class ShardRouter:
+    def __init__(self, shards: List[RemoteShard], generation_ttl: float = 5.0,
+                 on_new_generation: Optional[Callable[[str], None]] = None):
+        """
+        Maps departments to the index servers that own them. Shards report opaque
+        generation tokens (server instance + index generation); each new token is mapped
+        to a local, increasing generation, so caches keyed by generation drop stale
+        results after a shard reindexes or restarts. A background thread refreshes the
+        tokens every generation_ttl seconds, so lookups never wait on a shard (search
+        responses update them too). on_new_generation(department) is called when one changes.
+        """
+        self.shards = shards
+        self.on_new_generation = on_new_generation
+        self._owners: Dict[str, RemoteShard] = {}
+        for shard in shards:
+            for dept in shard.departments:
+                self._owners[dept] = shard
+        self.generation_ttl = generation_ttl
+        self._tokens: Dict[str, str] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="shard-generations", daemon=True)
+        if shards:
+            self._refresher.start()
+
+    @classmethod
+    def from_env(cls, on_new_generation: Optional[Callable[[str], None]] = None) -> Optional["ShardRouter"]:
+        """
+        INDEX_SHARDS="http://localhost:8101=finance,general;http://localhost:8102=hr,marketing"
+        """
+        spec = os.getenv("INDEX_SHARDS", "").strip()
+        if not spec:
+            return None
+        timeout = float(os.getenv("SHARD_TIMEOUT", "5"))
+        token = os.getenv("INDEX_SHARD_TOKEN")
+        shards = []
+        for entry in spec.split(";"):
+            if not entry.strip():
+                continue
+            url, _, departments = entry.partition("=")
+            shards.append(RemoteShard(
+                url.strip(), [d.strip() for d in departments.split(",") if d.strip()], timeout, token
+            ))
+        logger.info(f"Using index shards: {shards}")
+        return cls(shards, float(os.getenv("SHARD_GENERATION_TTL", "5")), on_new_generation)
+
+    @property
+    def departments(self) -> frozenset:
+        return frozenset(self._owners)
+
+    def owner(self, department: str) -> Optional[RemoteShard]:
+        return self._owners.get(department.lower())
+
+    def plan(self, departments: List[str]) -> Dict[RemoteShard, List[str]]:
+        """The shards covering `departments`, each with the departments it should search."""
+        plan: Dict[RemoteShard, List[str]] = {}
+        for dept in departments:
+            shard = self.owner(dept)
+            if shard is not None:
+                plan.setdefault(shard, []).append(dept.lower())
+        return plan
+
+    def observe(self, department: str, token: str):
+        with self._lock:
+            if self._tokens.get(department) == token:
+                return
+            self._tokens[department] = token
+            self._generations[department] = self._generations.get(department, 0) + 1
+        if self.on_new_generation is not None:
+            self.on_new_generation(department)
+
+    def refresh(self):
+        """Fetch every shard's generation tokens once; an unreachable shard keeps its last ones."""
+        for shard in self.shards:
+            try:
+                for dept, token in shard.generations().items():
+                    self.observe(dept, token)
+            except Exception as e:
+                logger.warning(f"Could not refresh generations from {shard.url}: {e}")
+
+    def _refresh_loop(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.generation_ttl):
+                return
+
+    def close(self):
+        self._stop.set()
+
+    def get_generation(self, department: str) -> int:
+        return self._generations.get(department.lower(), 0)
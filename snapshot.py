@@ -0,0 +1,104 @@
+import io
+import os
+import json
+import hashlib
+import zipfile
+import argparse
+import logging
+from typing import Dict, List
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snapshot.zip"
+
+
+def corpus_manifest_hash(file_paths: List[str], data_root: str, embeddings_id: str) -> str:
+    """
+    Hash of a department's source files (relative path and content) and the embedding
+    model, so a snapshot is only reused for the exact corpus and vector space it was built from.
+    """
+    digest = hashlib.sha256(embeddings_id.encode("utf-8"))
+    for path in sorted(file_paths):
+        digest.update(os.path.relpath(path, data_root).replace(os.sep, "/").encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_path(snapshot_dir: str, department: str) -> str:
+    return os.path.join(snapshot_dir, f"{department.lower()}{SNAPSHOT_SUFFIX}")
+
+
+def write_snapshot(path: str, manifest: Dict, ids: List[str], embeddings: np.ndarray,
+                   documents: List[str], metadatas: List[Dict]):
+    """
+    Write a versioned single-file snapshot: manifest.json, embeddings.npy and records.jsonl.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    manifest = dict(manifest, format_version=SNAPSHOT_FORMAT_VERSION, count=len(ids),
+                    dimension=int(embeddings.shape[1]) if len(ids) else 0)
+
+    vectors = io.BytesIO()
+    np.save(vectors, embeddings.astype(np.float32))
+
+    records = "\n".join(
+        json.dumps({"id": id_, "document": doc, "metadata": meta or {}}, ensure_ascii=False)
+        for id_, doc, meta in zip(ids, documents, metadatas)
+    )
+
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        archive.writestr("embeddings.npy", vectors.getvalue())
+        archive.writestr("records.jsonl", records)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_manifest(path: str) -> Dict:
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version {manifest.get('format_version')} in {path}")
+    return manifest
+
+
+def read_snapshot(path: str):
+    """Return (manifest, ids, embeddings, documents, metadatas) from a snapshot archive."""
+    manifest = read_snapshot_manifest(path)
+    with zipfile.ZipFile(path) as archive:
+        embeddings = np.load(io.BytesIO(archive.read("embeddings.npy")))
+        lines = archive.read("records.jsonl").decode("utf-8").splitlines()
+    records = [json.loads(line) for line in lines if line]
+    ids = [record["id"] for record in records]
+    documents = [record["document"] for record in records]
+    metadatas = [record["metadata"] for record in records]
+    return manifest, ids, embeddings, documents, metadatas
+
+
+if __name__ == "__main__":
+    from vector_store import VectorStoreManager
+
+    parser = argparse.ArgumentParser(description="Export or import department index snapshots.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--departments", nargs="*", help="Departments to process (default: all available)")
+    parser.add_argument("--snapshot-dir", default=os.getenv("SNAPSHOT_DIR", "./snapshots"))
+    parser.add_argument("--force", action="store_true", help="Import even if the corpus manifest does not match")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manager = VectorStoreManager()
+    departments = args.departments or manager.get_available_departments()
+
+    for department in departments:
+        path = snapshot_path(args.snapshot_dir, department)
+        if args.command == "export":
+            manager.export_snapshot(department, path)
+            print(f"Exported {department} -> {path}")
+        elif manager.import_snapshot(path, force=args.force):
+            print(f"Imported {department} <- {path}")
+        else:
+            print(f"Skipped {department}: no matching snapshot at {path}")
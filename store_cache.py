@@ -0,0 +1,234 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def directory_size_bytes(path: str) -> int:
+    """
+    Total size of the files under a directory, used as an estimate of a store's resident
+    size: chromadb loads a collection's HNSW segment fully into memory on first query, and
+    that segment dominates the directory; the sqlite part is paged and counted generously.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def detach_chroma_path(path: str) -> List[Any]:
+    """
+    Forget chromadb's process-wide client systems for a persist directory without stopping
+    them, and return them. chromadb caches one System (sqlite connection, loaded HNSW
+    segments) per path at class level, so dropping the langchain wrapper alone frees
+    nothing, and reopening a path whose files were replaced would reuse handles bound to
+    the old files. Once detached, the next open of the path gets a fresh system while
+    stores already holding the old one keep working until it is stopped.
+    """
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except ImportError:
+        try:
+            from chromadb.api.client import SharedSystemClient
+        except ImportError:
+            return []
+    systems = getattr(SharedSystemClient, "_identifer_to_system", None)
+    if not systems:
+        return []
+    target = os.path.abspath(path)
+    detached = []
+    for identifier in [key for key in list(systems) if key and os.path.abspath(key) == target]:
+        system = systems.pop(identifier, None)
+        if system is not None:
+            detached.append(system)
+    return detached
+
+
+def stop_chroma_systems(systems: Iterable[Any]):
+    for system in systems:
+        try:
+            system.stop()
+        except Exception as e:
+            logger.warning(f"Error stopping chromadb system: {e}")
+
+
+def release_chroma_path(path: str):
+    """Detach and stop chromadb's systems for a path nothing is using any more."""
+    stop_chroma_systems(detach_chroma_path(path))
+
+
+def _store_path(store: Any) -> Optional[str]:
+    return getattr(store, "_persist_directory", None)
+
+
+class VectorStoreCache:
+    def __init__(self, memory_budget_bytes: int, pinned: Iterable[str] = ("general",)):
+        """
+        LRU cache of loaded department vector stores bounded by a memory budget.
+        Sizes are on-disk estimates (see directory_size_bytes), not measured resident memory.
+        Pinned departments are never evicted; evicted stores release their chromadb system
+        and are reloaded lazily from disk.
+        Stores taken with acquire() (or put(lease=True)) are held until release(): a held
+        store is never evicted, so a profile larger than the budget stays loaded while it is
+        searched, and a held store that is discarded keeps its chromadb system until the
+        last holder releases it. The budget is enforced again as holds are released.
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self.pinned = {dept.lower() for dept in pinned}
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # id(store) -> number of holders, and the detached systems of discarded held stores
+        self._leases: Dict[int, int] = {}
+        self._retired: Dict[int, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, department: str) -> bool:
+        with self._lock:
+            return department in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def get(self, department: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(department)
+            if entry is None:
+                return None
+            self._entries.move_to_end(department)
+            return entry[0]
+
+    def acquire(self, department: str) -> Optional[Any]:
+        """The cached store, held until release(store); None if it isn't loaded."""
+        with self._lock:
+            entry = self._entries.get(department)
+            if entry is None:
+                return None
+            self._entries.move_to_end(department)
+            self._lease(entry[0])
+            return entry[0]
+
+    def release(self, store: Any):
+        with self._lock:
+            key = id(store)
+            holders = self._leases.get(key, 0) - 1
+            if holders > 0:
+                self._leases[key] = holders
+                return
+            self._leases.pop(key, None)
+            retired = self._retired.pop(key, [])
+            evicted = self._evict()
+        stop_chroma_systems(retired)
+        self._stop(evicted)
+
+    def put(self, department: str, store: Any, size_bytes: int, lease: bool = False):
+        with self._lock:
+            previous = self._entries.get(department)
+            self._entries[department] = (store, size_bytes)
+            self._entries.move_to_end(department)
+            if lease:
+                self._lease(store)
+            evicted = self._evict(keep=department)
+        if previous is not None and previous[0] is not store:
+            self._retire(previous[0])
+        self._stop(evicted)
+
+    def discard(self, department: str) -> Optional[Any]:
+        """
+        Drop a department's store (its index is being replaced) and detach its chromadb
+        system right away, so the path can be reopened; the system is stopped now, or
+        when the last holder releases the store.
+        """
+        with self._lock:
+            entry = self._entries.pop(department, None)
+        if entry is None:
+            return None
+        self._retire(entry[0])
+        return entry[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {dept: size for dept, (_, size) in self._entries.items()}
+
+    def _lease(self, store: Any):
+        self._leases[id(store)] = self._leases.get(id(store), 0) + 1
+
+    def _retire(self, store: Any):
+        path = _store_path(store)
+        systems = detach_chroma_path(path) if path else []
+        with self._lock:
+            if id(store) in self._leases:
+                self._retired.setdefault(id(store), []).extend(systems)
+                return
+        stop_chroma_systems(systems)
+
+    def _stop(self, stores: List[Any]):
+        for store in stores:
+            path = _store_path(store)
+            if path:
+                release_chroma_path(path)
+
+    def _evict(self, keep: Optional[str] = None) -> List[Any]:
+        evicted = []
+        total = sum(size for _, size in self._entries.values())
+        for department in list(self._entries.keys()):
+            if total <= self.memory_budget_bytes:
+                break
+            store, size = self._entries[department]
+            if department == keep or department in self.pinned or id(store) in self._leases:
+                continue
+            del self._entries[department]
+            evicted.append(store)
+            total -= size
+            logger.info(f"Evicted vector store for {department} ({size / 1e6:.1f} MB) to stay within memory budget")
+        return evicted
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: int = 2048):
+        """
+        LRU cache of per-department search results keyed by
+        (department, index generation, normalized query, k). Generations change on every
+        reindex, so entries for an old index can never be hit again and simply age out.
+        Entries are per department, so users whose scopes overlap share them.
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
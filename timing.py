@@ -0,0 +1,114 @@
+import os
+import io
+import re
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Oldest stored profiles beyond this count are deleted
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Only one cProfile session can be active per process (enforced since Python 3.12)
+_profile_lock = threading.Lock()
+# Set on the thread running a profiled request
+_local = threading.local()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class StageTimer:
+    """
+    Accumulates wall-clock time per named stage of one request and renders it as a
+    Server-Timing header. Safe to share between the event loop and a worker thread.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def merge(self, other: "StageTimer"):
+        for name, seconds in other.stages.items():
+            self.add(name, seconds)
+
+    def header_value(self) -> str:
+        with self._lock:
+            items = list(self.stages.items())
+        # Metric names must be HTTP tokens
+        return ", ".join(f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={seconds * 1000:.1f}" for name, seconds in items)
+
+
+def _prune_profiles():
+    try:
+        paths = [os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".prof")]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(0, len(paths) - PROFILE_MAX_FILES)]:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def running_inline() -> bool:
+    """
+    True on a thread running a profiled request. cProfile only sees its own thread, so
+    work normally handed to pools (department search, embedding batcher, LLM calls) runs
+    inline there instead.
+    """
+    return getattr(_local, "inline", False)
+
+
+def profile_call(fn: Callable, *args, **kwargs) -> Tuple[Any, str]:
+    """
+    Run fn under cProfile in the current thread, with everything it would hand to other
+    threads run inline (see running_inline), and store the stats in PROFILE_DIR.
+    Returns the result and the profile id. Raises ProfilerBusy if another request is
+    being profiled.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("Another request is being profiled")
+    try:
+        profiler = cProfile.Profile()
+        _local.inline = True
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            _local.inline = False
+            profile_id = uuid.uuid4().hex
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+            _prune_profiles()
+    finally:
+        _profile_lock.release()
+    return result, profile_id
+
+
+def read_profile_summary(profile_id: str, limit: int = 40) -> Optional[str]:
+    """Top functions by cumulative time of a stored profile, or None if it does not exist."""
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    if not os.path.exists(path):
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
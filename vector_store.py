@@ -1,25 +1,150 @@
 import os
+import time
+import queue
+import uuid
+import shutil
 import logging
-from typing import List, Optional, Dict
+import threading
+import numpy as np
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Iterator, List, Optional, Dict
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from langchain_text_splitters import MarkdownTextSplitter
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from document_loader import load_and_split_documents
+from embeddings import get_embeddings, get_embeddings_id
+from ingest import (
+    BUILD_STAMP_FILENAME, build_incomplete, checkpoint_dir_for, department_build_lock, ingest_department,
+    read_build_stamp, write_build_stamp
+)
+from store_cache import RetrievalCache, VectorStoreCache, directory_size_bytes, release_chroma_path
+from profiles import AccessProfileIndex, profile_key
+from chunk_registry import ChunkRegistry
+from router import DepartmentRouter
+from shards import ShardRouter
+from timing import running_inline
+from deadline import Deadline
+from snapshot import (
+    corpus_manifest_hash, read_snapshot, read_snapshot_manifest, snapshot_path, write_snapshot
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+class EmbeddingBatcher:
+    def __init__(self, embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Micro-batches query embeddings from concurrent requests: a single worker thread
+        collects texts for up to max_wait_ms (or max_batch_size texts) and runs one
+        batched forward pass. It only waits while other callers are known to be pending,
+        so a lone request is embedded immediately.
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            self._queue.put((text, future))
+            return future.result()
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < min(self.max_batch_size, self._pending):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _ in batch])
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"Embedding backend returned {len(vectors)} vectors for {len(batch)} texts")
+            except Exception as e:
+                # Every caller must be released, never left waiting on an unresolved future
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
 class VectorStoreManager:
-    def __init__(self, data_root: str = "data", embeddings_model: str = "all-mpnet-base-v2", persist_dir: str = "./chroma_db"):
+    def __init__(self, data_root: str = "data", embeddings_model: str = "all-mpnet-base-v2", persist_dir: str = "./chroma_db",
+                 embeddings_backend: Optional[str] = None, embeddings_threads: Optional[int] = None,
+                 memory_budget_mb: Optional[int] = None, pinned_departments: Optional[List[str]] = None):
         """
         Initialize the vector store manager with ChromaDB.
+        The embeddings backend (torch, onnx, onnx-int8, distilled) defaults to EMBEDDINGS_BACKEND.
+        Loaded stores are kept in an LRU cache bounded by VECTORSTORE_MEMORY_BUDGET_MB;
+        departments in VECTORSTORE_PINNED are never evicted.
         """
         self.data_root = data_root
-        self.embeddings = HuggingFaceEmbeddings(model_name=embeddings_model)
+        embeddings_backend = embeddings_backend or os.getenv("EMBEDDINGS_BACKEND", "torch")
+        if embeddings_threads is None and os.getenv("EMBEDDINGS_THREADS"):
+            embeddings_threads = int(os.getenv("EMBEDDINGS_THREADS"))
+        self.embeddings = get_embeddings(embeddings_model, embeddings_backend, embeddings_threads)
+        self.embeddings_id = get_embeddings_id(embeddings_model, embeddings_backend)
+
+        # Vectors from different backends are not comparable, so keep their indexes apart
+        if embeddings_backend.lower() != "torch":
+            persist_dir = os.path.join(persist_dir, embeddings_backend.lower())
         self.persist_dir = persist_dir
-        self.vector_stores: Dict[str, Chroma] = {}
+        if memory_budget_mb is None:
+            memory_budget_mb = int(os.getenv("VECTORSTORE_MEMORY_BUDGET_MB", "1024"))
+        if pinned_departments is None:
+            pinned_departments = [d.strip() for d in os.getenv("VECTORSTORE_PINNED", "general").split(",") if d.strip()]
+        self.vector_stores = VectorStoreCache(memory_budget_mb * 1024 * 1024, pinned=pinned_departments)
+        
+        # One lock per department so concurrent queries and warm-ups load or build a store only once
+        self._department_locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        
+        # Query embeddings from concurrent requests share batched forward passes
+        self.query_embedder = EmbeddingBatcher(
+            self.embeddings,
+            max_batch_size=int(os.getenv("EMBED_BATCH_MAX", "32")),
+            max_wait_ms=float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+        )
+        
+        # Stores a request couldn't wait for keep loading (or building) here
+        self._load_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("STORE_LOAD_WORKERS", "4")), thread_name_prefix="store-load"
+        )
+        self._loads: Dict[str, Future] = {}
+        
+        # One virtual index per distinct access profile (e.g. C-level, finance + general)
+        self._profile_indexes: Dict[tuple, AccessProfileIndex] = {}
+        
+        # Index generation per department, bumped on every (re)index; keys the retrieval cache.
+        # Build stamps on disk are checked on lookup, so indexes replaced by another process
+        # (ingest/snapshot CLI, another worker) also move to a new generation.
+        self.generations: Dict[str, int] = {}
+        self._build_stamps: Dict[str, tuple] = {}
+        self._loaded_stamps: Dict[str, str] = {}
+        self.chunk_registry = ChunkRegistry()
+        
+        # Optional centroid router that skips departments unlikely to answer a query
+        self.router = DepartmentRouter.from_env(self)
+        self.retrieval_cache = RetrievalCache(max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048")))
+        
+        # Departments owned by remote index servers (INDEX_SHARDS) are searched there, never loaded here
+        self.shards = ShardRouter.from_env(on_new_generation=self.chunk_registry.forget_department)
         
         # Ensure persist directory exists
         os.makedirs(persist_dir, exist_ok=True)
@@ -37,62 +162,193 @@ class VectorStoreManager:
                     file_paths.append(os.path.join(root, file))
         return file_paths
 
-    def get_department_vectorstore(self, department: str) -> Optional[Chroma]:
-        """Get or create vector store for a department."""
+    def _department_lock(self, department: str) -> threading.RLock:
+        with self._locks_guard:
+            return self._department_locks.setdefault(department, threading.RLock())
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query through the micro-batching scheduler (inline for a profiled request)."""
+        if running_inline():
+            return self.embeddings.embed_query(text)
+        return self.query_embedder.embed_query(text)
+
+    def is_remote(self, department: str) -> bool:
+        return self.shards is not None and self.shards.owner(department) is not None
+
+    def get_generation(self, department: str) -> int:
+        if self.is_remote(department):
+            return self.shards.get_generation(department)
         department = department.lower()
-        collection_name = f"dept_{department}"
-        
-        # Return cached vector store if available
-        if department in self.vector_stores:
-            return self.vector_stores[department]
-        
-        # Check if persisted vector store exists
+        self._check_build_stamp(department)
+        return self.generations.get(department, 0)
+
+    def _check_build_stamp(self, department: str):
+        """
+        Bump the generation if the on-disk build changed. Only stats (and on change reads)
+        the stamp: never waits on the department lock or touches the loaded store, which
+        is replaced on its next use (see _serves_old_build).
+        """
         dept_persist_dir = os.path.join(self.persist_dir, department)
-        if os.path.exists(dept_persist_dir) and os.listdir(dept_persist_dir):
-            try:
-                vectorstore = Chroma(
-                    collection_name=collection_name,
-                    embedding_function=self.embeddings,
-                    persist_directory=dept_persist_dir
-                )
-                self.vector_stores[department] = vectorstore
-                logger.info(f"Loaded existing vector store for {department}")
-                return vectorstore
-            except Exception as e:
-                logger.warning(f"Error loading existing vector store for {department}: {e}")
+        try:
+            mtime = os.stat(os.path.join(dept_persist_dir, BUILD_STAMP_FILENAME)).st_mtime_ns
+        except OSError:
+            mtime = 0
+        known = self._build_stamps.get(department)
+        if known is not None and known[0] == mtime:
+            return
+
+        stamp = read_build_stamp(dept_persist_dir)
+        with self._locks_guard:
+            previous = self._build_stamps.get(department)
+            self._build_stamps[department] = (mtime, stamp)
+        if previous is None or previous[1] == stamp:
+            return
+
+        logger.info(f"Index for {department} changed on disk; moving to a new generation")
+        self._bump_generation(department)
+
+    def _serves_old_build(self, department: str) -> bool:
+        """True if the loaded store was opened on a build that has since been replaced on disk."""
+        loaded = self._loaded_stamps.get(department)
+        current = self._build_stamps.get(department)
+        return loaded is not None and current is not None and loaded != current[1]
+
+    def _record_loaded(self, department: str, dept_persist_dir: str):
+        """Remember which build a freshly opened store serves, so our own changes aren't re-detected."""
+        stamp = read_build_stamp(dept_persist_dir)
+        try:
+            mtime = os.stat(os.path.join(dept_persist_dir, BUILD_STAMP_FILENAME)).st_mtime_ns
+        except OSError:
+            mtime = 0
+        with self._locks_guard:
+            self._build_stamps[department] = (mtime, stamp)
+            self._loaded_stamps[department] = stamp
+
+    def _bump_generation(self, department: str):
+        with self._locks_guard:
+            self.generations[department] = self.generations.get(department, 0) + 1
+        self.chunk_registry.forget_department(department)
+
+    def get_department_vectorstore(self, department: str, lease: bool = False) -> Optional[Chroma]:
+        """
+        Get or create vector store for a department (None if a remote shard owns it).
+        With lease=True the store is held (see VectorStoreCache) and must be given back
+        with vector_stores.release(); prefer held_vectorstores().
+        """
+        department = department.lower()
+        if self.is_remote(department):
+            return None
         
-        # Create new vector store
-        file_paths = self._get_department_files(department)
-        print(f"Files for {department}: {file_paths}")
+        # Return cached vector store if available (and still serving the build on disk)
+        self._check_build_stamp(department)
+        get_cached = self.vector_stores.acquire if lease else self.vector_stores.get
+        if not self._serves_old_build(department):
+            cached = get_cached(department)
+            if cached is not None:
+                return cached
         
-        if not file_paths:
-            logger.warning(f"No files found for department: {department}")
+        with self._department_lock(department):
+            if self._serves_old_build(department):
+                # Replaced by another process; searches holding the old store finish on it
+                self.vector_stores.discard(department)
+                self._loaded_stamps.pop(department, None)
+            # Another thread may have loaded it while we waited
+            cached = get_cached(department)
+            if cached is not None:
+                return cached
+            return self._load_or_build_vectorstore(department, lease)
+
+    @contextmanager
+    def held_vectorstores(self, departments: List[str], deadline: Optional[Deadline] = None) -> Iterator[Dict[str, Chroma]]:
+        """
+        Load the departments' stores and hold them for the block: loading one can't evict
+        another, and none is stopped under a search, even if its index is swapped meanwhile.
+        With a deadline, stores that aren't loaded by then are left out and keep loading
+        in the background.
+        """
+        held = {}
+        try:
+            for department in departments:
+                if deadline is None or running_inline():
+                    vectorstore = self.get_department_vectorstore(department, lease=True)
+                else:
+                    vectorstore = self._acquire_within(department, deadline)
+                if vectorstore is not None:
+                    held[department.lower()] = vectorstore
+            yield held
+        finally:
+            for vectorstore in held.values():
+                self.vector_stores.release(vectorstore)
+
+    def _acquire_within(self, department: str, deadline: Deadline) -> Optional[Chroma]:
+        """Hold the department's store if it is (or gets) loaded before the deadline."""
+        department = department.lower()
+        if self.is_remote(department):
             return None
+        self._check_build_stamp(department)
+        if not self._serves_old_build(department):
+            vectorstore = self.vector_stores.acquire(department)
+            if vectorstore is not None:
+                return vectorstore
 
+        with self._locks_guard:
+            future = self._loads.get(department)
+            if future is None or future.done():
+                future = self._load_pool.submit(self.get_department_vectorstore, department)
+                self._loads[department] = future
         try:
-            docs = load_and_split_documents(file_paths)
-            print(f"Loaded docs: {len(docs)}")
-            
-            # Filter documents for this department
-            dept_docs = [doc for doc in docs if doc.metadata.get('department', '').lower() == department]
-            print(f"Filtered docs: {len(dept_docs)}")
-            
-            if not dept_docs:
-                logger.warning(f"No documents found for department: {department}")
-                return None
-
-            # Create vector store with persistence
-            os.makedirs(dept_persist_dir, exist_ok=True)
-            vectorstore = Chroma.from_documents(
-                documents=dept_docs,
-                embedding=self.embeddings,
-                collection_name=collection_name,
+            future.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            logger.warning(f"Store for {department} is still loading; leaving it out of this request")
+            return None
+        except Exception as e:
+            logger.warning(f"Loading store for {department} failed: {e}")
+            return None
+        return self.vector_stores.acquire(department)
+
+    def _open_persisted_vectorstore(self, department: str, lease: bool = False) -> Optional[Chroma]:
+        """Open the department's finished index on disk; None if there is none (or it can't be opened)."""
+        dept_persist_dir = os.path.join(self.persist_dir, department)
+        if not (os.path.exists(dept_persist_dir) and os.listdir(dept_persist_dir)) or build_incomplete(dept_persist_dir):
+            return None
+        try:
+            vectorstore = Chroma(
+                collection_name=f"dept_{department}",
+                embedding_function=self.embeddings,
                 persist_directory=dept_persist_dir
             )
-            
-            self.vector_stores[department] = vectorstore
-            logger.info(f"Created vector store for {department} with {len(dept_docs)} documents")
+            self.vector_stores.put(department, vectorstore, directory_size_bytes(dept_persist_dir), lease=lease)
+            self._record_loaded(department, dept_persist_dir)
+            logger.info(f"Loaded existing vector store for {department}")
             return vectorstore
+        except Exception as e:
+            logger.warning(f"Error loading existing vector store for {department}: {e}")
+            return None
+
+    def _load_or_build_vectorstore(self, department: str, lease: bool = False) -> Optional[Chroma]:
+        # Check if persisted vector store exists (and is not a half-finished build)
+        vectorstore = self._open_persisted_vectorstore(department, lease)
+        if vectorstore is not None:
+            return vectorstore
+        
+        # Create new vector store (checkpointed, so an interrupted build resumes). Another
+        # process (ingest CLI, reindex worker) may be building or swapping this department:
+        # wait for it and serve its build rather than starting a second one on the same files
+        dept_persist_dir = os.path.join(self.persist_dir, department)
+        try:
+            with department_build_lock(self.persist_dir, department):
+                vectorstore = self._open_persisted_vectorstore(department, lease)
+                if vectorstore is not None:
+                    return vectorstore
+                
+                vectorstore = ingest_department(self, department)
+                if vectorstore is None:
+                    return None
+                
+                self._bump_generation(department)
+                self.vector_stores.put(department, vectorstore, directory_size_bytes(dept_persist_dir), lease=lease)
+                self._record_loaded(department, dept_persist_dir)
+                return vectorstore
             
         except Exception as e:
             logger.error(f"Error creating vector store for {department}: {e}")
@@ -110,19 +366,57 @@ class VectorStoreManager:
                     departments.append(item.lower())
         return departments
     
+    def get_profile_index(self, departments: List[str]) -> AccessProfileIndex:
+        """
+        Index over exactly the given access scope, searched with a single global top-k.
+        """
+        key = profile_key(departments)
+        with self._locks_guard:
+            index = self._profile_indexes.get(key)
+            if index is None:
+                index = AccessProfileIndex(self, key)
+                self._profile_indexes[key] = index
+        return index
+
+    def warm_up(self, departments: List[str]):
+        """
+        Load (or build) the given department stores and run one tiny query against each,
+        so a user's first query doesn't pay for it: chromadb only loads a collection's HNSW
+        segment on its first query. Meant to run in the background after login.
+        """
+        query_vector = self.embed_query("warm up")
+        
+        for department in departments:
+            try:
+                with self.held_vectorstores([department]) as stores:
+                    for vectorstore in stores.values():
+                        vectorstore.similarity_search_by_vector(query_vector, k=1)
+            except Exception as e:
+                logger.warning(f"Warm-up failed for {department}: {e}")
+
     def refresh_department_vectorstore(self, department: str) -> Optional[Chroma]:
         """Refresh vector store for a department by recreating it."""
         department = department.lower()
         
+        with self._department_lock(department), department_build_lock(self.persist_dir, department):
+            return self._refresh_department_vectorstore(department)
+
+    def _refresh_department_vectorstore(self, department: str) -> Optional[Chroma]:
         try:
-            # Remove from cache
-            if department in self.vector_stores:
-                del self.vector_stores[department]
+            # Remove from cache; the new generation makes cached retrieval results unreachable
+            self.vector_stores.discard(department)
+            self._bump_generation(department)
+            # Record the coming gap as known, so lookups during the rebuild don't see a change;
+            # the rebuilt store records its own stamp
+            with self._locks_guard:
+                self._build_stamps[department] = (0, "")
+                self._loaded_stamps.pop(department, None)
             
-            # Remove persisted data
+            # Remove persisted data (and chromadb's cached handles on it; searches still
+            # holding the old store keep its handles until they finish)
             dept_persist_dir = os.path.join(self.persist_dir, department)
+            release_chroma_path(dept_persist_dir)
             if os.path.exists(dept_persist_dir):
-                import shutil
                 shutil.rmtree(dept_persist_dir)
             
             # Recreate vector store
@@ -130,4 +424,138 @@ class VectorStoreManager:
             
         except Exception as e:
             logger.error(f"Error refreshing vector store for {department}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def swap_in_index(self, department: str, staging_dir: str) -> Chroma:
+        """
+        Replace a department's index with one built elsewhere (e.g. by a reindex worker)
+        and start serving it; cached retrieval results move to the new generation.
+        chromadb caches its client system per path, so the live path's system is detached
+        before the directories are swapped; otherwise the reopened store would keep using
+        handles bound to the old files. Searches still holding the old store keep its system
+        (its files stay open after the rename) until they finish.
+        """
+        department = department.lower()
+        dept_persist_dir = os.path.join(self.persist_dir, department)
+        old_dir = f"{dept_persist_dir}.old"
+
+        with self._department_lock(department), department_build_lock(self.persist_dir, department):
+            self.vector_stores.discard(department)
+            release_chroma_path(dept_persist_dir)
+            release_chroma_path(staging_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            if os.path.exists(dept_persist_dir):
+                os.rename(dept_persist_dir, old_dir)
+            os.rename(staging_dir, dept_persist_dir)
+
+            # The staging build's checkpoint becomes the department's
+            shutil.rmtree(checkpoint_dir_for(dept_persist_dir), ignore_errors=True)
+            if os.path.exists(checkpoint_dir_for(staging_dir)):
+                os.rename(checkpoint_dir_for(staging_dir), checkpoint_dir_for(dept_persist_dir))
+
+            vectorstore = Chroma(
+                collection_name=f"dept_{department}",
+                embedding_function=self.embeddings,
+                persist_directory=dept_persist_dir
+            )
+            self.vector_stores.put(department, vectorstore, directory_size_bytes(dept_persist_dir))
+            self._record_loaded(department, dept_persist_dir)
+            self._bump_generation(department)
+
+        shutil.rmtree(old_dir, ignore_errors=True)
+        logger.info(f"Swapped in new vector store for {department}")
+        return vectorstore
+
+    def get_corpus_manifest_hash(self, department: str) -> str:
+        """Hash of the department's source files and the embedding model id."""
+        return corpus_manifest_hash(self._get_department_files(department), self.data_root, self.embeddings_id)
+
+    def export_snapshot(self, department: str, path: str) -> str:
+        """
+        Export a department index (vectors, documents, metadata) as a single versioned archive.
+        """
+        department = department.lower()
+        with self.held_vectorstores([department]) as stores:
+            if department not in stores:
+                raise ValueError(f"No vector store available for department: {department}")
+            data = stores[department].get(include=["embeddings", "documents", "metadatas"])
+        manifest = {
+            "department": department,
+            "collection_name": f"dept_{department}",
+            "embeddings_id": self.embeddings_id,
+            "manifest_hash": self.get_corpus_manifest_hash(department),
+        }
+        write_snapshot(
+            path,
+            manifest,
+            data["ids"],
+            np.asarray(data["embeddings"], dtype=np.float32),
+            data["documents"],
+            data["metadatas"]
+        )
+        logger.info(f"Exported snapshot for {department} with {len(data['ids'])} chunks to {path}")
+        return path
+
+    def import_snapshot(self, path: str, force: bool = False, batch_size: int = 1000) -> Optional[Chroma]:
+        """
+        Replace a department index with the contents of a snapshot. Unless forced, the
+        snapshot must match the current embedding model and corpus manifest.
+        """
+        if not os.path.exists(path):
+            return None
+
+        manifest = read_snapshot_manifest(path)
+        department = manifest["department"]
+        if manifest["embeddings_id"] != self.embeddings_id:
+            logger.warning(f"Snapshot {path} was built with {manifest['embeddings_id']}, not {self.embeddings_id}")
+            return None
+        if not force and manifest["manifest_hash"] != self.get_corpus_manifest_hash(department):
+            logger.info(f"Snapshot {path} is stale for the current {department} corpus")
+            return None
+
+        _, ids, embeddings, documents, metadatas = read_snapshot(path)
+
+        # Load into a staging directory, then install it like a finished reindex
+        staging_dir = os.path.join(self.persist_dir, f"{department}.staging-{uuid.uuid4().hex[:8]}")
+        try:
+            os.makedirs(staging_dir)
+            staging = Chroma(
+                collection_name=f"dept_{department}",
+                embedding_function=self.embeddings,
+                persist_directory=staging_dir
+            )
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                staging._collection.add(
+                    ids=ids[start:end],
+                    embeddings=embeddings[start:end].tolist(),
+                    documents=documents[start:end],
+                    metadatas=[meta or None for meta in metadatas[start:end]]
+                )
+            del staging
+            write_build_stamp(staging_dir)
+            vectorstore = self.swap_in_index(department, staging_dir)
+        except Exception:
+            release_chroma_path(staging_dir)
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Imported snapshot for {department} with {len(ids)} chunks from {path}")
+        return vectorstore
+
+    def restore_snapshots(self, snapshot_dir: str) -> List[str]:
+        """
+        At startup, load snapshots for departments that have no local index yet and whose
+        manifest matches the current corpus. Returns the restored departments.
+        """
+        restored = []
+        for department in self.get_available_departments():
+            dept_persist_dir = os.path.join(self.persist_dir, department)
+            if os.path.exists(dept_persist_dir) and os.listdir(dept_persist_dir):
+                continue
+            try:
+                if self.import_snapshot(snapshot_path(snapshot_dir, department)) is not None:
+                    restored.append(department)
+            except Exception as e:
+                logger.warning(f"Error restoring snapshot for {department}: {e}")
+        return restored